@@ -1,47 +1,121 @@
-import os
-import sys
-import pandas as pd
-import logging
-
-
-sys.path.append(os.path.abspath('./src'))
-from preprocessing import load_train_data, run_preproc
-from scorer import make_pred
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/service.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-def main():
-    logger.info('Starting one-shot ML scoring service (no watchdog)')
-    input_file = '/app/input/test.csv'  # здесь добавляю упрощенную логику
-    output_file = '/app/output/sample_submission.csv'
-
-    if not os.path.exists(input_file):
-        logger.error(f"Input file not found: {input_file}")
-        return
-
-    logger.info('Loading training data...')
-    train = load_train_data()
-    logger.info('Reading input data...')
-    input_df = pd.read_csv(input_file)
-    # .drop(columns=['name_1', 'name_2', 'street', 'post_code'])
-
-    logger.info('Preprocessing...')
-    processed = run_preproc(train, input_df)
-
-    logger.info('Scoring...')
-    submission = make_pred('input/test.csv')
-
-    logger.info(f'Saving predictions to {output_file}')
-    submission.to_csv(output_file, index=False)
-    logger.info('Done!')
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import os
+import sys
+import pandas as pd
+import logging
+
+
+sys.path.append(os.path.abspath('./src'))
+from daily_aggregates import DailyAggregateStore
+from preprocessing import collect_daily_aggregates, get_feature_state, run_preproc
+from feature_imp_and_density_plot import score_histogram
+from scorer import build_submission, model_features, model_th, predict_scores, save_reports, score_csv_in_chunks, start_reports
+from timing import report_timings, stage_timer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('/app/logs/service.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Отчеты (графики скоров и важности признаков): background - в отдельном процессе после записи сабмита,
+# sync - в основном процессе, off - не строить
+REPORTS_MODE = os.getenv('REPORTS_MODE', 'background')
+
+def run_reports(score_counts, state, output_dir, timings):
+    if REPORTS_MODE == 'off':
+        return None
+
+    with stage_timer('reports', timings):
+        if REPORTS_MODE == 'sync':
+            save_reports(score_counts, state['model_features'], output_dir=output_dir)
+            return None
+        return start_reports(score_counts, state['model_features'], output_dir=output_dir)
+
+def finish(reports_process, output_dir, timings):
+    report_timings(timings, json_path=f'{output_dir}/stage_timings.json')
+
+    if reports_process is not None:
+        logger.info('Submission is ready, waiting for background reports...')
+        reports_process.join()
+        if reports_process.exitcode != 0:
+            logger.error(f'Reports process failed with exit code {reports_process.exitcode}')
+    logger.info('Done!')
+
+def score_in_chunks(input_file, output_dir, output_file, state, chunksize, timings, store=None):
+    # Потоковый режим: пиковая память определяется размером чанка, а не размером файла
+    logger.info(f'Streaming mode: chunksize={chunksize}')
+
+    with stage_timer('daily_aggregates', timings):
+        aggregates = collect_daily_aggregates(input_file, chunksize, store)
+
+    with stage_timer('score_chunks', timings):
+        logger.info(f'Saving predictions to {output_file}')
+        score_counts = score_csv_in_chunks(input_file, output_file, state, chunksize, aggregates)
+
+    return run_reports(score_counts, state, output_dir, timings)
+
+def main():
+    logger.info('Starting one-shot ML scoring service (no watchdog)')
+    input_file = os.getenv('INPUT_FILE', '/app/input/test.csv')  # здесь добавляю упрощенную логику
+    output_dir = os.getenv('OUTPUT_DIR', '/app/output')
+    output_file = f'{output_dir}/sample_submission.csv'
+    # Размер чанка для потокового режима; 0 - весь файл читается целиком
+    chunksize = int(os.getenv('SCORING_CHUNKSIZE', '0'))
+    # Инкрементальное хранилище дневных агрегатов; пусто - агрегаты считаются по входному файлу
+    aggregates_path = os.getenv('DAILY_AGGREGATES_PATH', '')
+
+    if not os.path.exists(input_file):
+        logger.error(f"Input file not found: {input_file}")
+        return
+
+    # Единый пайплайн: каждый этап выполняется один раз и замеряется
+    timings = {}
+
+    with stage_timer('load_feature_state', timings):
+        state = get_feature_state(model_features, model_th)
+
+    store = None
+    if aggregates_path:
+        with stage_timer('load_daily_aggregates', timings):
+            store = DailyAggregateStore.load_or_create(aggregates_path)
+
+    if chunksize > 0:
+        reports_process = score_in_chunks(input_file, output_dir, output_file, state, chunksize, timings, store)
+        if store is not None:
+            store.save(aggregates_path)
+        finish(reports_process, output_dir, timings)
+        return
+
+    with stage_timer('read_input', timings):
+        input_df = pd.read_csv(input_file)
+        # .drop(columns=['name_1', 'name_2', 'street', 'post_code'])
+
+    aggregates = None
+    if store is not None:
+        with stage_timer('daily_aggregates', timings):
+            aggregates = store.aggregates(store.update(input_df))
+
+    with stage_timer('preprocessing', timings):
+        processed = run_preproc(state, input_df, aggregates)
+
+    with stage_timer('scoring', timings):
+        probs = predict_scores(processed, state)
+
+    with stage_timer('save_submission', timings):
+        submission = build_submission(input_df.index, probs, state['threshold'])
+        logger.info(f'Saving predictions to {output_file}')
+        submission.to_csv(output_file, index=False)
+
+    reports_process = run_reports(score_histogram(probs), state, output_dir, timings)
+
+    if store is not None:
+        store.save(aggregates_path)
+
+    finish(reports_process, output_dir, timings)
+
+if __name__ == "__main__":
+    main()
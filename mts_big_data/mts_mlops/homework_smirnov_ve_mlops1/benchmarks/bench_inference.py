@@ -0,0 +1,75 @@
+"""
+Бенчмарк бэкендов инференса: строк/сек на батче и на одиночных строках.
+
+Признаки строятся через run_preproc один раз, дальше замеряется только predict_proba
+на float32-матрице. Для каждого бэкенда выводится и максимальное расхождение скоров
+с CatBoost (ONNX считает в float32, возможны отличия в младших разрядах).
+
+Запуск из корня сервиса:
+    python benchmarks/bench_inference.py --input ./models/train.csv --rows 100000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from inference import ONNX_MODEL_PATH, make_backend, to_matrix
+from preprocessing import get_feature_state, run_preproc
+from scorer import model, model_features, model_th
+
+
+def batch_throughput(backend, X, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend.predict_proba(X)
+    return repeats * len(X) / (time.perf_counter() - start)
+
+
+def single_row_throughput(backend, X):
+    rows = [X[i:i + 1] for i in range(len(X))]
+    start = time.perf_counter()
+    for row in rows:
+        backend.predict_proba(row)
+    return len(rows) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='./models/train.csv', help='CSV с транзакциями')
+    parser.add_argument('--rows', type=int, default=100000, help='Размер батча')
+    parser.add_argument('--single-rows', type=int, default=2000, help='Сколько строк скорить по одной')
+    parser.add_argument('--repeats', type=int, default=5, help='Повторов батчевого замера')
+    parser.add_argument('--onnx-path', default=ONNX_MODEL_PATH, help='Путь к ONNX-модели (экспортируется, если нет)')
+    args = parser.parse_args()
+
+    state = get_feature_state(model_features, model_th)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    df = pd.read_csv(args.input, nrows=args.rows).drop(columns=['target'], errors='ignore')
+    X = to_matrix(run_preproc(state, df), state['model_features'])
+
+    backends = [
+        ('catboost, 1 thread', make_backend(model, 'catboost', thread_count=1)),
+        ('catboost, all threads', make_backend(model, 'catboost', thread_count=-1)),
+        ('onnx, 1 thread', make_backend(model, 'onnx', thread_count=1, onnx_path=args.onnx_path)),
+        ('onnx, all threads', make_backend(model, 'onnx', thread_count=-1, onnx_path=args.onnx_path)),
+    ]
+    reference = backends[0][1].predict_proba(X)
+
+    print(f"{'backend':>22} | {'batch rows/s':>12} | {'single rows/s':>13} | {'max |diff|':>10}")
+    for name, backend in backends:
+        diff = np.abs(backend.predict_proba(X) - reference).max()
+        batch = batch_throughput(backend, X, args.repeats)
+        single = single_row_throughput(backend, X[:args.single_rows])
+        print(f"{name:>22} | {batch:>12.0f} | {single:>13.0f} | {diff:>10.2e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Бенчмарк признаков праздников и части суток: построчный apply (прежняя реализация)
+против join по календарю праздников и индексирования массива по часу.
+
+Запуск из корня сервиса:
+    python benchmarks/bench_time_features.py --rows 1000000,10000000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import holidays
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from preprocessing import assign_time_of_day, holiday_names, time_of_day
+
+
+# Прежняя реализация - для сравнения
+def legacy_holiday_names(transaction_time):
+    us_holidays = holidays.US(years=[2018, 2019, 2020, 2021])
+
+    def get_holiday_name(date):
+        return us_holidays.get(date) if date in us_holidays else "No Holiday"
+
+    return transaction_time.apply(get_holiday_name)
+
+
+def legacy_time_of_day(hours):
+    return hours.apply(assign_time_of_day)
+
+
+def make_transaction_time(n_rows: int) -> pd.Series:
+    rng = np.random.default_rng(42)
+    start = pd.Timestamp('2019-01-01').value // 10**9
+    seconds = rng.integers(start, start + 2 * 365 * 24 * 3600, n_rows)
+    return pd.Series(pd.to_datetime(seconds, unit='s'))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='1000000,10000000', help='Размеры выборки через запятую')
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} | {'feature':>12} | {'apply, s':>9} | {'vector, s':>9} | {'speedup':>7}")
+    for n_rows in [int(x) for x in args.rows.split(',')]:
+        transaction_time = make_transaction_time(n_rows)
+        hours = transaction_time.dt.hour
+
+        cases = [
+            ('holidays', legacy_holiday_names, holiday_names, transaction_time),
+            ('time_of_day', legacy_time_of_day, time_of_day, hours),
+        ]
+        for name, legacy, vectorized, column in cases:
+            old, old_seconds = timed(legacy, column)
+            new, new_seconds = timed(vectorized, column)
+            assert (old.to_numpy() == new.to_numpy()).all(), f'{name}: results differ'
+            print(f"{n_rows:>10} | {name:>12} | {old_seconds:>9.2f} | {new_seconds:>9.2f} | {old_seconds / new_seconds:>6.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,220 @@
+# Инкрементальное хранилище дневных агрегатов по amount
+#
+# Вместо groupby по всей истории на каждом запуске храним по каждой дате (и паре дата/пол)
+# компактный скетч распределения сумм. Новые транзакции только добавляются в скетчи,
+# а признаки для даты считаются из скетча без пересчета истории.
+
+import logging
+import math
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from preprocessing import time_of_day
+
+logger = logging.getLogger(__name__)
+
+DAILY_AGGREGATES_VERSION = 1
+
+
+class QuantileSketch:
+    """
+    Скетч квантилей с логарифмическими корзинами (по схеме DDSketch).
+    Значение x > 0 попадает в корзину ceil(log_gamma(x)), gamma = (1 + a) / (1 - a),
+    поэтому оценка любого квантиля имеет относительную ошибку не больше a.
+    В каждой корзине хранится число значений и их точная сумма: суммы и средние считаются точно.
+    Скетчи складываются (merge) без потери точности.
+    """
+
+    ZERO_KEY = -(2 ** 31)  # корзина для нулевых (и отрицательных) сумм
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.bins = {}  # key -> [count, sum]
+
+    def keys(self, values):
+        values = np.asarray(values, dtype=float)
+        keys = np.full(values.shape, self.ZERO_KEY, dtype=np.int64)
+        positive = values > 0
+        keys[positive] = np.ceil(np.log(values[positive]) / math.log(self.gamma)).astype(np.int64)
+        return keys
+
+    def value(self, key):
+        if key == self.ZERO_KEY:
+            return 0.0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add_bin(self, key, count, total):
+        bin_ = self.bins.setdefault(key, [0, 0.0])
+        bin_[0] += int(count)
+        bin_[1] += float(total)
+
+    def merge(self, other):
+        for key, (count, total) in other.bins.items():
+            self.add_bin(key, count, total)
+        return self
+
+    @property
+    def count(self):
+        return sum(count for count, _ in self.bins.values())
+
+    @property
+    def total(self):
+        return sum(total for _, total in self.bins.values())
+
+    def value_at_rank(self, rank):
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key][0]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.bins))
+
+    def quantile(self, q):
+        # Линейная интерполяция между соседними рангами - как в pandas quantile/median
+        count = self.count
+        if count == 0:
+            return np.nan
+        rank = q * (count - 1)
+        lower, upper = math.floor(rank), math.ceil(rank)
+        lower_value = self.value_at_rank(lower)
+        if upper == lower:
+            return lower_value
+        return lower_value + (self.value_at_rank(upper) - lower_value) * (rank - lower)
+
+    def sum_above(self, threshold):
+        # Сумма значений из корзин выше корзины порога; корзина самого порога
+        # учитывается целиком, если среднее значение в ней больше порога
+        threshold_key = self.keys([threshold])[0]
+        return sum(
+            total for key, (count, total) in self.bins.items()
+            if key > threshold_key or (key == threshold_key and total / count > threshold)
+        )
+
+
+class DailyAggregateStore:
+    """
+    Дневные агрегаты по transaction_date (строка YYYY-MM-DD) и по паре (transaction_date, gender):
+    все транзакции дня, ночные транзакции дня и транзакции дня по полу.
+    update() добавляет только новые транзакции; aggregates() отдает таблицы в том же формате,
+    что compute_amount_and_night_aggregates / compute_gender_daily_stats.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.version = DAILY_AGGREGATES_VERSION
+        self.relative_accuracy = relative_accuracy
+        self.daily = {}   # date -> QuantileSketch
+        self.night = {}   # date -> QuantileSketch
+        self.gender = {}  # date -> {gender: QuantileSketch}
+
+    def _sketch(self, table, key):
+        if key not in table:
+            table[key] = QuantileSketch(self.relative_accuracy)
+        return table[key]
+
+    @staticmethod
+    def _grouped(frame, by):
+        # Число и сумма транзакций по группе и корзине скетча
+        grouped = frame.groupby(by + ['key'])['amount'].agg(['size', 'sum'])
+        return zip(grouped.index, grouped['size'], grouped['sum'])
+
+    def update(self, df):
+        """
+        Добавляет транзакции (колонки transaction_time, amount, gender) в хранилище.
+        Возвращает множество затронутых дат.
+        """
+        transaction_time = pd.to_datetime(df['transaction_time'])
+        frame = pd.DataFrame({
+            'transaction_date': transaction_time.dt.strftime('%Y-%m-%d'),
+            'gender': df['gender'].to_numpy(),
+            'amount': df['amount'].to_numpy(dtype=float),
+            'night': (time_of_day(transaction_time.dt.hour) == "night").to_numpy(),
+        })
+        frame['key'] = QuantileSketch(self.relative_accuracy).keys(frame['amount'])
+
+        for (date, key), count, total in self._grouped(frame, ['transaction_date']):
+            self._sketch(self.daily, date).add_bin(key, count, total)
+        for (date, key), count, total in self._grouped(frame[frame['night']], ['transaction_date']):
+            self._sketch(self.night, date).add_bin(key, count, total)
+        for (date, gender, key), count, total in self._grouped(frame, ['transaction_date', 'gender']):
+            self._sketch(self.gender.setdefault(date, {}), gender).add_bin(key, count, total)
+        return set(frame['transaction_date'].dropna().unique())
+
+    def lookup(self, date, gender=None):
+        """Дневные признаки для одной даты (и пола) без обращения к истории транзакций."""
+        # Значения по умолчанию - как после merge и fillna в process_amount_and_night_features
+        features = {
+            'sum_by_night_part': 0, 'mean_by_night_part': 0, 'median_by_night_part': 0,
+            'percentile_90': -np.inf, 'sum_more_than_90': 0,
+            'count': np.nan, 'mean_amount': np.nan, 'median_amount': np.nan, 'total_sum': np.nan,
+        }
+        night = self.night.get(date)
+        if night is not None and night.count:
+            features['sum_by_night_part'] = night.total
+            features['mean_by_night_part'] = night.total / night.count
+            features['median_by_night_part'] = night.quantile(0.5)
+
+        daily = self.daily.get(date)
+        if daily is not None and daily.count:
+            features['percentile_90'] = daily.quantile(0.9)
+            features['sum_more_than_90'] = daily.sum_above(features['percentile_90'])
+
+        by_gender = self.gender.get(date, {}).get(gender)
+        if by_gender is not None and by_gender.count:
+            features['count'] = by_gender.count
+            features['mean_amount'] = by_gender.total / by_gender.count
+            features['median_amount'] = by_gender.quantile(0.5)
+            features['total_sum'] = by_gender.total
+        return features
+
+    def aggregates(self, dates=None):
+        """Таблицы агрегатов для run_preproc(aggregates=...); dates ограничивает набор дат."""
+        dates = sorted(self.daily if dates is None else set(dates) & set(self.daily))
+
+        night_rows, percentile_rows, high_rows, gender_rows = [], [], [], []
+        for date in dates:
+            features = self.lookup(date)
+            night = self.night.get(date)
+            if night is not None and night.count:
+                night_rows.append((date, features['sum_by_night_part'],
+                                   features['mean_by_night_part'], features['median_by_night_part']))
+            percentile_rows.append((date, features['percentile_90']))
+            high_rows.append((date, features['sum_more_than_90']))
+
+            for gender, sketch in self.gender.get(date, {}).items():
+                if sketch.count:
+                    gender_rows.append((date, gender, sketch.count, sketch.total / sketch.count,
+                                        sketch.quantile(0.5), sketch.total))
+
+        return {
+            'night': pd.DataFrame(night_rows, columns=['transaction_date', 'sum_by_night_part',
+                                                       'mean_by_night_part', 'median_by_night_part']),
+            'percentile_90': pd.DataFrame(percentile_rows, columns=['transaction_date', 'percentile_90']),
+            'sum_more_than_90': pd.DataFrame(high_rows, columns=['transaction_date', 'sum_more_than_90']),
+            'gender': pd.DataFrame(gender_rows, columns=['transaction_date', 'gender', 'count',
+                                                         'mean_amount', 'median_amount', 'total_sum']),
+        }
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info('Daily aggregates saved to %s (%d dates)', path, len(self.daily))
+
+    @classmethod
+    def load_or_create(cls, path, relative_accuracy=0.01):
+        if not os.path.exists(path):
+            logger.info('Daily aggregates not found at %s, starting empty store', path)
+            return cls(relative_accuracy)
+
+        store = joblib.load(path)
+        if getattr(store, 'version', None) != DAILY_AGGREGATES_VERSION:
+            raise ValueError(
+                f"Daily aggregates {path} have version {getattr(store, 'version', None)}, "
+                f"expected {DAILY_AGGREGATES_VERSION}. Remove the file to rebuild it"
+            )
+        logger.info('Daily aggregates loaded from %s (%d dates)', path, len(store.daily))
+        return store
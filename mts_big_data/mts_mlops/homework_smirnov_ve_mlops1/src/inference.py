@@ -0,0 +1,81 @@
+# Бэкенды инференса модели
+#
+# catboost - CatBoostClassifier.predict_proba на непрерывной float32-матрице в порядке model_features
+#            (CatBoost сам приводит признаки к float32, так что лишнего копирования нет) с thread_count;
+# onnx     - та же модель, экспортированная в ONNX, исполняется onnxruntime на CPU.
+# Бэкенд выбирается переменной INFERENCE_BACKEND.
+
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'catboost')
+# -1 - все ядра (как по умолчанию в CatBoost)
+INFERENCE_THREADS = int(os.getenv('INFERENCE_THREADS', '-1'))
+ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', './models/my_catboost.onnx')
+
+
+def to_matrix(X, model_features=None) -> np.ndarray:
+    """Непрерывная float32-матрица; DataFrame переупорядочивается по model_features."""
+    if isinstance(X, pd.DataFrame):
+        X = X[model_features].to_numpy(dtype=np.float32)
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    return X.reshape(1, -1) if X.ndim == 1 else X
+
+
+class CatBoostBackend:
+    name = 'catboost'
+
+    def __init__(self, model, thread_count=INFERENCE_THREADS):
+        self.model = model
+        self.thread_count = thread_count
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """Вероятность положительного класса для каждой строки X."""
+        return self.model.predict_proba(X, thread_count=self.thread_count)[:, 1]
+
+
+class OnnxBackend:
+    name = 'onnx'
+
+    def __init__(self, onnx_path, thread_count=INFERENCE_THREADS):
+        # onnxruntime нужен только для этого бэкенда
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if thread_count > 0:
+            options.intra_op_num_threads = thread_count
+        self.session = ort.InferenceSession(onnx_path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.output_name = 'probabilities'
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        probabilities = self.session.run([self.output_name], {self.input_name: X})[0]
+        if isinstance(probabilities, np.ndarray):
+            return probabilities[:, 1]
+        # Экспорт CatBoost отдает вероятности через ZipMap: список словарей {класс: вероятность}
+        return np.fromiter((row[1] for row in probabilities), dtype=np.float32, count=len(probabilities))
+
+
+def export_onnx(model, onnx_path=ONNX_MODEL_PATH):
+    model.save_model(onnx_path, format='onnx')
+    logger.info('Model exported to ONNX: %s', onnx_path)
+
+
+def make_backend(model, name=INFERENCE_BACKEND, thread_count=INFERENCE_THREADS, onnx_path=ONNX_MODEL_PATH):
+    if name == 'catboost':
+        backend = CatBoostBackend(model, thread_count)
+    elif name == 'onnx':
+        # ONNX-файл экспортируется из загруженной модели при первом запуске
+        if not os.path.exists(onnx_path):
+            export_onnx(model, onnx_path)
+        backend = OnnxBackend(onnx_path, thread_count)
+    else:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{name}', expected 'catboost' or 'onnx'")
+
+    logger.info('Inference backend: %s (thread_count=%s)', backend.name, thread_count)
+    return backend
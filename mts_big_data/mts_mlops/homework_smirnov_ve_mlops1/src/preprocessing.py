@@ -1,264 +1,345 @@
-# импорты
-
-import pandas as pd
-import numpy as np
-import holidays
-from math import atan2, cos, radians, sin, sqrt
-import category_encoders as ce
-
-import logging
-
-logger = logging.getLogger(__name__)
-RANDOM_STATE = 42
-
-# даты
-
-
-def assign_time_of_day(hour):
-    if 6 <= hour < 12:
-        return "morning"
-    elif 12 <= hour < 18:
-        return "afternoon"
-    elif 18 <= hour < 24:
-        return "evening"
-    else:
-        return "night"
-
-
-def process_transaction_time_features(train_df, test_df):
-    # Конвертация типов
-    train_df['transaction_time'] = pd.to_datetime(train_df['transaction_time'])
-    test_df['transaction_time'] = pd.to_datetime(test_df['transaction_time'])
-
-    # Отдельная дата
-    train_df['transaction_date'] = train_df['transaction_time'].dt.date
-    test_df['transaction_date'] = test_df['transaction_time'].dt.date
-
-    # Праздники (ВАЖНО: расширить годы, если потребуется)
-    us_holidays = holidays.US(years=[2018, 2019, 2020, 2021])
-
-    def get_holiday_name(date):
-        return us_holidays.get(date) if date in us_holidays else "No Holiday"
-
-    # Месяц, неделя, день недели, часы, минуты
-    for df in [train_df, test_df]:
-        df['transaction_time_month'] = df['transaction_time'].dt.month
-        df['transaction_time_week'] = df['transaction_time'].dt.isocalendar().week
-        df['transaction_time_day_of_the_week'] = df['transaction_time'].dt.dayofweek
-        df['transaction_time_hour'] = df['transaction_time'].dt.hour
-        df['transaction_time_minute'] = df['transaction_time'].dt.minute
-
-        df["transaction_time_holidays"] = df["transaction_time"].apply(get_holiday_name)
-        df['transaction_time_binning_by_part'] = df['transaction_time_hour'].apply(assign_time_of_day)
-
-    return train_df, test_df
-
-
-## расстояния
-
-def haversine_distance(lat1, lon1, lat2, lon2, n_digits=0):
-    lat1, lon1, lat2, lon2 = round(lat1, 6), round(lon1, 6), round(lat2, 6), round(lon2, 6)
-    phi1, phi2 = np.radians(lat1), np.radians(lat2)
-    dphi = np.radians(lat2 - lat1)
-    dlambda = np.radians(lon2 - lon1)
-    a = np.sin(dphi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2)**2
-    return round(2 * 6372800 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), n_digits)
-
-
-def bearing_degree(lat1, lon1, lat2, lon2, n_digits=0):
-    lat1, lon1 = np.radians(round(lat1, 6)), np.radians(round(lon1, 6))
-    lat2, lon2 = np.radians(round(lat2, 6)), np.radians(round(lon2, 6))
-    dlon = lon2 - lon1
-    numerator = np.sin(dlon) * np.cos(lat2)
-    denominator = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
-    theta = np.arctan2(numerator, denominator)
-    theta_deg = (np.degrees(theta) + 360) % 360
-    return round(theta_deg, n_digits)
-
-
-def process_distance_features(train_df, test_df):
-    # bearing_degree
-    train_df['bearing_degree_1'] = bearing_degree(train_df['lat'], train_df['lon'], train_df['merchant_lat'], train_df['merchant_lon']).values
-    test_df['bearing_degree_1'] = bearing_degree(test_df['lat'], test_df['lon'], test_df['merchant_lat'], test_df['merchant_lon']).values
-
-    train_df['bearing_degree_2'] = bearing_degree(train_df['lat'], train_df['lon'], 0, 0).values
-    test_df['bearing_degree_2'] = bearing_degree(test_df['lat'], test_df['lon'], 0, 0).values
-
-    train_df['bearing_degree_3'] = bearing_degree(0, 0, train_df['merchant_lat'], train_df['merchant_lon']).values
-    test_df['bearing_degree_3'] = bearing_degree(0, 0, test_df['merchant_lat'], test_df['merchant_lon']).values
-
-    # haversine
-    train_df['hav_dist_1'] = haversine_distance(train_df['lat'], train_df['lon'], train_df['merchant_lat'], train_df['merchant_lon']).values
-    test_df['hav_dist_1'] = haversine_distance(test_df['lat'], test_df['lon'], test_df['merchant_lat'], test_df['merchant_lon']).values
-
-    train_df['hav_dist_2'] = haversine_distance(train_df['lat'], train_df['lon'], 0, 0).values
-    test_df['hav_dist_2'] = haversine_distance(test_df['lat'], test_df['lon'], 0, 0).values
-
-    train_df['hav_dist_3'] = haversine_distance(0, 0, train_df['merchant_lat'], train_df['merchant_lon']).values
-    test_df['hav_dist_3'] = haversine_distance(0, 0, test_df['merchant_lat'], test_df['merchant_lon']).values
-
-    return train_df, test_df
-
-
-# логарифмы, перцентили, ночные транзакции
-
-def process_amount_and_night_features(train_df, test_df):
-    # Приводим даты к строке для надежного merge (можно заменить на pd.to_datetime при необходимости)
-    train_df['transaction_date'] = train_df['transaction_date'].astype(str)
-    test_df['transaction_date'] = test_df['transaction_date'].astype(str)
-
-    # Логарифм суммы
-    train_df['amount_log'] = np.log1p(train_df['amount'])
-    test_df['amount_log'] = np.log1p(test_df['amount'])
-
-    # Ночные транзакции
-    train_night = train_df[train_df['transaction_time_binning_by_part'] == "night"]
-    test_night = test_df[test_df['transaction_time_binning_by_part'] == "night"]
-
-    # Агрегаты по ночным транзакциям
-    def night_agg(df):
-        if df.empty:
-            return pd.DataFrame({'transaction_date': [], 
-                                 'sum_by_night_part': [], 
-                                 'mean_by_night_part': [], 
-                                 'median_by_night_part': []})
-        return df.groupby('transaction_date')['amount'].agg(
-            sum_by_night_part='sum',
-            mean_by_night_part='mean',
-            median_by_night_part='median'
-        ).reset_index()
-    
-    train_night_agg = night_agg(train_night)
-    test_night_agg = night_agg(test_night)
-
-    train_df = train_df.merge(train_night_agg, on='transaction_date', how='left')
-    test_df = test_df.merge(test_night_agg, on='transaction_date', how='left')
-
-    # 90-й перцентиль по amount
-    def percentile_90(df):
-        if df.empty:
-            return pd.DataFrame({'transaction_date': [], 'percentile_90': []})
-        return df.groupby('transaction_date')['amount'].quantile(0.9).reset_index(name='percentile_90')
-    
-    train_90 = percentile_90(train_df)
-    test_90 = percentile_90(test_df)
-
-    train_df = train_df.merge(train_90, on='transaction_date', how='left')
-    test_df = test_df.merge(test_90, on='transaction_date', how='left')
-
-    # Защита: если колонка вдруг не появилась (мердж не сработал), создаём вручную
-    if 'percentile_90' not in train_df.columns:
-        train_df['percentile_90'] = -np.inf
-    else:
-        train_df['percentile_90'] = train_df['percentile_90'].fillna(-np.inf)
-    if 'percentile_90' not in test_df.columns:
-        test_df['percentile_90'] = -np.inf
-    else:
-        test_df['percentile_90'] = test_df['percentile_90'].fillna(-np.inf)
-
-    # Сумма транзакций выше 90-го перцентиля
-    def high_sum(df):
-        if df.empty or 'percentile_90' not in df.columns:
-            return pd.DataFrame({'transaction_date': [], 'sum_more_than_90': []})
-        filtered = df[df['amount'] > df['percentile_90']]
-        if filtered.empty:
-            # Важно: если нет ни одной строки, добавим пустой датафрейм
-            return pd.DataFrame({'transaction_date': df['transaction_date'].unique(), 'sum_more_than_90': [0]*len(df['transaction_date'].unique())})
-        return filtered.groupby('transaction_date')['amount'].sum().reset_index(name='sum_more_than_90')
-    
-    train_high = high_sum(train_df)
-    test_high = high_sum(test_df)
-
-    train_df = train_df.merge(train_high, on='transaction_date', how='left')
-    test_df = test_df.merge(test_high, on='transaction_date', how='left')
-
-    # Заполняем пропуски нулями
-    for col in ['sum_by_night_part', 'mean_by_night_part', 'median_by_night_part', 'sum_more_than_90']:
-        if col not in train_df.columns:
-            train_df[col] = 0
-        else:
-            train_df[col] = train_df[col].fillna(0)
-        if col not in test_df.columns:
-            test_df[col] = 0
-        else:
-            test_df[col] = test_df[col].fillna(0)
-
-    return train_df, test_df
-
-def process_gender_daily_stats(train_df, test_df):
-    # Агрегация по полу и дате — для train
-    gender_daily_stats_train = train_df.groupby(['transaction_date', 'gender']).agg(
-        count=('amount', 'size'),
-        mean_amount=('amount', 'mean'),
-        median_amount=('amount', 'median'),
-        total_sum=('amount', 'sum')
-    ).reset_index()
-
-    train_df = pd.merge(train_df, gender_daily_stats_train, on=['transaction_date', 'gender'], how='left')
-
-    # Аналогично — для test
-    gender_daily_stats_test = test_df.groupby(['transaction_date', 'gender']).agg(
-        count=('amount', 'size'),
-        mean_amount=('amount', 'mean'),
-        median_amount=('amount', 'median'),
-        total_sum=('amount', 'sum')
-    ).reset_index()
-
-    test_df = pd.merge(test_df, gender_daily_stats_test, on=['transaction_date', 'gender'], how='left')
-
-    return train_df, test_df
-
-# catboost encoding
-
-def process_catboost_encoding(train_df, test_df, target_column='target'):
-    train_df['ts_transaction_time'] = pd.to_datetime(train_df['transaction_time']).values.astype('int64') // 10**9
-    test_df['ts_transaction_time'] = pd.to_datetime(test_df['transaction_time']).values.astype('int64') // 10**9
-
-    cat_prep_cols = ['gender', 'jobs', 'transaction_time_holidays', 'transaction_time_binning_by_part']
-    for col in cat_prep_cols:
-        train_df[col] = train_df[col].astype(str)
-        test_df[col] = test_df[col].astype(str)
-    train_df[cat_prep_cols] = train_df[cat_prep_cols].fillna('пропуск')
-    test_df[cat_prep_cols] = test_df[cat_prep_cols].fillna('пропуск')
-
-    cat_columns = [
-        'merch', 'cat_id', 'name_1', 'name_2', 'gender', 'street', 'one_city', 'us_state',
-        'jobs', 'post_code', 'transaction_time_holidays', 'transaction_time_binning_by_part'
-    ]
-    cb_columns = [c + '_cb' for c in cat_columns]
-    train_df = train_df.drop(columns=[c for c in cb_columns if c in train_df.columns], errors='ignore')
-    test_df = test_df.drop(columns=[c for c in cb_columns if c in test_df.columns], errors='ignore')
-
-    target_enc = ce.CatBoostEncoder(cols=cat_columns)
-    target_enc = target_enc.fit(train_df[cat_columns], train_df[target_column])
-    train_df = train_df.join(target_enc.transform(train_df[cat_columns]).add_suffix('_cb'))
-    test_df = test_df.join(target_enc.transform(test_df[cat_columns]).add_suffix('_cb'))
-
-    return train_df, test_df
-
-
-def load_train_data():
-    logger.info('Loading training data...')
-    train = pd.read_csv("./models/train.csv")
-    train['transaction_time'] = pd.to_datetime(train['transaction_time'])
-    train['transaction_date'] = train['transaction_time'].dt.date
-
-    train, _ = process_transaction_time_features(train, train.copy())
-    train, _ = process_distance_features(train, train.copy())
-    train, _ = process_amount_and_night_features(train, train.copy())
-    train, _ = process_gender_daily_stats(train, train.copy())
-    train, _ = process_catboost_encoding(train, train.copy())
-    logger.info('Train data processed. Shape: %s', train.shape)
-    return train
-
-
-def run_preproc(train_df, test_df):
-    test_df['transaction_time'] = pd.to_datetime(test_df['transaction_time'])
-    test_df['transaction_date'] = test_df['transaction_time'].dt.date
-
-    _, test_df = process_transaction_time_features(train_df.copy(), test_df)
-    _, test_df = process_distance_features(train_df.copy(), test_df)
-    _, test_df = process_amount_and_night_features(train_df.copy(), test_df)
-    _, test_df = process_gender_daily_stats(train_df.copy(), test_df)
-    _, test_df = process_catboost_encoding(train_df.copy(), test_df)
-    return test_df
\ No newline at end of file
+# импорты
+
+import os
+import pandas as pd
+import numpy as np
+import holidays
+from datetime import datetime, timezone
+from math import atan2, cos, radians, sin, sqrt
+import category_encoders as ce
+import joblib
+
+import logging
+
+logger = logging.getLogger(__name__)
+RANDOM_STATE = 42
+
+# Артефакт с обученным состоянием препроцессинга (энкодер, список признаков, порог)
+FEATURE_STATE_VERSION = 1
+FEATURE_STATE_PATH = os.getenv('FEATURE_STATE_PATH', './models/feature_state.joblib')
+TRAIN_DATA_PATH = './models/train.csv'
+
+CAT_COLUMNS = [
+    'merch', 'cat_id', 'name_1', 'name_2', 'gender', 'street', 'one_city', 'us_state',
+    'jobs', 'post_code', 'transaction_time_holidays', 'transaction_time_binning_by_part'
+]
+
+# даты
+
+
+def assign_time_of_day(hour):
+    if 6 <= hour < 12:
+        return "morning"
+    elif 12 <= hour < 18:
+        return "afternoon"
+    elif 18 <= hour < 24:
+        return "evening"
+    else:
+        return "night"
+
+
+# Часть суток для каждого часа 0..23: вместо apply по строкам - индексирование массива
+TIME_OF_DAY_BY_HOUR = np.array([assign_time_of_day(hour) for hour in range(24)], dtype=object)
+
+
+def time_of_day(hours):
+    # Пропуски (NaT) дают "night", как и assign_time_of_day(NaN)
+    hour_idx = hours.fillna(0).to_numpy(dtype=np.int64)
+    return pd.Series(TIME_OF_DAY_BY_HOUR[hour_idx], index=hours.index)
+
+
+def holiday_names(transaction_time):
+    """
+    Название праздника по дате или "No Holiday".
+    Календарь строится на все годы, встречающиеся в данных, и присоединяется по дате.
+    """
+    dates = transaction_time.dt.normalize()
+    years = sorted(int(year) for year in dates.dt.year.dropna().unique())
+    holidays_by_date = pd.Series({
+        pd.Timestamp(date): name for date, name in holidays.US(years=years).items()
+    }, dtype=object)
+    return dates.map(holidays_by_date).fillna("No Holiday")
+
+
+def process_transaction_time_features(df):
+    # Конвертация типов
+    df['transaction_time'] = pd.to_datetime(df['transaction_time'])
+
+    # Отдельная дата
+    df['transaction_date'] = df['transaction_time'].dt.date
+
+    # Месяц, неделя, день недели, часы, минуты
+    df['transaction_time_month'] = df['transaction_time'].dt.month
+    df['transaction_time_week'] = df['transaction_time'].dt.isocalendar().week
+    df['transaction_time_day_of_the_week'] = df['transaction_time'].dt.dayofweek
+    df['transaction_time_hour'] = df['transaction_time'].dt.hour
+    df['transaction_time_minute'] = df['transaction_time'].dt.minute
+
+    # Праздники (годы календаря берутся из данных) и часть суток
+    df["transaction_time_holidays"] = holiday_names(df["transaction_time"])
+    df['transaction_time_binning_by_part'] = time_of_day(df['transaction_time_hour'])
+
+    return df
+
+
+## расстояния
+
+def haversine_distance(lat1, lon1, lat2, lon2, n_digits=0):
+    lat1, lon1, lat2, lon2 = round(lat1, 6), round(lon1, 6), round(lat2, 6), round(lon2, 6)
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2)**2
+    return round(2 * 6372800 * np.arctan2(np.sqrt(a), np.sqrt(1 - a)), n_digits)
+
+
+def bearing_degree(lat1, lon1, lat2, lon2, n_digits=0):
+    lat1, lon1 = np.radians(round(lat1, 6)), np.radians(round(lon1, 6))
+    lat2, lon2 = np.radians(round(lat2, 6)), np.radians(round(lon2, 6))
+    dlon = lon2 - lon1
+    numerator = np.sin(dlon) * np.cos(lat2)
+    denominator = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    theta = np.arctan2(numerator, denominator)
+    theta_deg = (np.degrees(theta) + 360) % 360
+    return round(theta_deg, n_digits)
+
+
+def process_distance_features(df):
+    # bearing_degree
+    df['bearing_degree_1'] = bearing_degree(df['lat'], df['lon'], df['merchant_lat'], df['merchant_lon']).values
+    df['bearing_degree_2'] = bearing_degree(df['lat'], df['lon'], 0, 0).values
+    df['bearing_degree_3'] = bearing_degree(0, 0, df['merchant_lat'], df['merchant_lon']).values
+
+    # haversine
+    df['hav_dist_1'] = haversine_distance(df['lat'], df['lon'], df['merchant_lat'], df['merchant_lon']).values
+    df['hav_dist_2'] = haversine_distance(df['lat'], df['lon'], 0, 0).values
+    df['hav_dist_3'] = haversine_distance(0, 0, df['merchant_lat'], df['merchant_lon']).values
+
+    return df
+
+
+# логарифмы, перцентили, ночные транзакции
+
+def compute_amount_and_night_aggregates(df):
+    """
+    Дневные агрегаты по amount: суммы/среднее/медиана ночных транзакций,
+    90-й перцентиль и сумма транзакций выше него. Ключ - transaction_date.
+    """
+    # Ночные транзакции
+    night = df[df['transaction_time_binning_by_part'] == "night"]
+
+    # Агрегаты по ночным транзакциям
+    def night_agg(df):
+        if df.empty:
+            return pd.DataFrame({'transaction_date': [],
+                                 'sum_by_night_part': [],
+                                 'mean_by_night_part': [],
+                                 'median_by_night_part': []})
+        return df.groupby('transaction_date')['amount'].agg(
+            sum_by_night_part='sum',
+            mean_by_night_part='mean',
+            median_by_night_part='median'
+        ).reset_index()
+
+    # 90-й перцентиль по amount
+    def percentile_90(df):
+        if df.empty:
+            return pd.DataFrame({'transaction_date': [], 'percentile_90': []})
+        return df.groupby('transaction_date')['amount'].quantile(0.9).reset_index(name='percentile_90')
+
+    # Сумма транзакций выше 90-го перцентиля
+    def high_sum(df):
+        if df.empty or 'percentile_90' not in df.columns:
+            return pd.DataFrame({'transaction_date': [], 'sum_more_than_90': []})
+        filtered = df[df['amount'] > df['percentile_90']]
+        if filtered.empty:
+            # Важно: если нет ни одной строки, добавим пустой датафрейм
+            return pd.DataFrame({'transaction_date': df['transaction_date'].unique(), 'sum_more_than_90': [0]*len(df['transaction_date'].unique())})
+        return filtered.groupby('transaction_date')['amount'].sum().reset_index(name='sum_more_than_90')
+
+    night_stats = night_agg(night)
+    percentile_stats = percentile_90(df)
+
+    with_percentile = df[['transaction_date', 'amount']].merge(percentile_stats, on='transaction_date', how='left')
+    with_percentile['percentile_90'] = with_percentile['percentile_90'].fillna(-np.inf)
+
+    return {
+        'night': night_stats,
+        'percentile_90': percentile_stats,
+        'sum_more_than_90': high_sum(with_percentile),
+    }
+
+
+def process_amount_and_night_features(df, aggregates=None):
+    # Приводим даты к строке для надежного merge (можно заменить на pd.to_datetime при необходимости)
+    df['transaction_date'] = df['transaction_date'].astype(str)
+
+    # Логарифм суммы
+    df['amount_log'] = np.log1p(df['amount'])
+
+    # Агрегаты считаются по самому df, если не переданы заранее посчитанные (потоковый режим)
+    if aggregates is None:
+        aggregates = compute_amount_and_night_aggregates(df)
+
+    df = df.merge(aggregates['night'], on='transaction_date', how='left')
+    df = df.merge(aggregates['percentile_90'], on='transaction_date', how='left')
+
+    # Защита: если колонка вдруг не появилась (мердж не сработал), создаём вручную
+    if 'percentile_90' not in df.columns:
+        df['percentile_90'] = -np.inf
+    else:
+        df['percentile_90'] = df['percentile_90'].fillna(-np.inf)
+
+    df = df.merge(aggregates['sum_more_than_90'], on='transaction_date', how='left')
+
+    # Заполняем пропуски нулями
+    for col in ['sum_by_night_part', 'mean_by_night_part', 'median_by_night_part', 'sum_more_than_90']:
+        if col not in df.columns:
+            df[col] = 0
+        else:
+            df[col] = df[col].fillna(0)
+
+    return df
+
+def compute_gender_daily_stats(df):
+    # Агрегация по полу и дате
+    return df.groupby(['transaction_date', 'gender']).agg(
+        count=('amount', 'size'),
+        mean_amount=('amount', 'mean'),
+        median_amount=('amount', 'median'),
+        total_sum=('amount', 'sum')
+    ).reset_index()
+
+def process_gender_daily_stats(df, gender_daily_stats=None):
+    if gender_daily_stats is None:
+        gender_daily_stats = compute_gender_daily_stats(df)
+
+    return pd.merge(df, gender_daily_stats, on=['transaction_date', 'gender'], how='left')
+
+
+def collect_daily_aggregates(path_to_file, chunksize, store=None):
+    """
+    Первый проход потокового режима: читает файл чанками только по нужным колонкам
+    и считает дневные агрегаты по всему файлу, как в run_preproc на полном файле.
+    В памяти держатся только дата, пол, сумма и часть суток - без признаков и строковых колонок.
+    Если передано хранилище DailyAggregateStore, чанки добавляются в него, и в памяти остаются только скетчи.
+    """
+    columns = ['transaction_time', 'amount', 'gender']
+
+    if store is not None:
+        dates = set()
+        for chunk in pd.read_csv(path_to_file, usecols=columns, chunksize=chunksize):
+            dates |= store.update(chunk)
+        return store.aggregates(dates)
+
+    compact_chunks = []
+    for chunk in pd.read_csv(path_to_file, usecols=columns, chunksize=chunksize):
+        transaction_time = pd.to_datetime(chunk['transaction_time'])
+        compact_chunks.append(pd.DataFrame({
+            'transaction_date': transaction_time.dt.normalize(),
+            'gender': chunk['gender'],
+            'amount': chunk['amount'],
+            'transaction_time_binning_by_part': time_of_day(transaction_time.dt.hour).astype('category'),
+        }))
+    compact = pd.concat(compact_chunks, ignore_index=True)
+    del compact_chunks
+
+    aggregates = compute_amount_and_night_aggregates(compact)
+    aggregates['gender'] = compute_gender_daily_stats(compact)
+
+    # Ключи к тому же строковому виду, что и transaction_date в process_amount_and_night_features
+    for table in aggregates.values():
+        if not table.empty:
+            table['transaction_date'] = pd.to_datetime(table['transaction_date']).dt.strftime('%Y-%m-%d')
+    return aggregates
+
+# catboost encoding
+
+def prepare_catboost_columns(df):
+    df['ts_transaction_time'] = pd.to_datetime(df['transaction_time']).values.astype('int64') // 10**9
+
+    cat_prep_cols = ['gender', 'jobs', 'transaction_time_holidays', 'transaction_time_binning_by_part']
+    for col in cat_prep_cols:
+        df[col] = df[col].astype(str)
+    df[cat_prep_cols] = df[cat_prep_cols].fillna('пропуск')
+
+    cb_columns = [c + '_cb' for c in CAT_COLUMNS]
+    return df.drop(columns=[c for c in cb_columns if c in df.columns], errors='ignore')
+
+
+def fit_catboost_encoder(train_df, target_column='target'):
+    train_df = prepare_catboost_columns(train_df)
+    target_enc = ce.CatBoostEncoder(cols=CAT_COLUMNS)
+    return target_enc.fit(train_df[CAT_COLUMNS], train_df[target_column])
+
+
+def process_catboost_encoding(df, encoder):
+    df = prepare_catboost_columns(df)
+    return df.join(encoder.transform(df[CAT_COLUMNS]).add_suffix('_cb'))
+
+
+def load_train_data():
+    logger.info('Loading training data...')
+    train = pd.read_csv(TRAIN_DATA_PATH)
+
+    train = process_transaction_time_features(train)
+    train = process_distance_features(train)
+    train = process_amount_and_night_features(train)
+    train = process_gender_daily_stats(train)
+    encoder = fit_catboost_encoder(train)
+    train = process_catboost_encoding(train, encoder)
+    logger.info('Train data processed. Shape: %s', train.shape)
+    return train, encoder
+
+
+# Состояние препроцессинга: обучается один раз на train.csv и сохраняется в артефакт
+
+def fit_feature_state(model_features, threshold):
+    _, encoder = load_train_data()
+    return {
+        'version': FEATURE_STATE_VERSION,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'encoder': encoder,
+        'cat_columns': CAT_COLUMNS,
+        'model_features': list(model_features),
+        'threshold': threshold,
+    }
+
+
+def save_feature_state(state, path=FEATURE_STATE_PATH):
+    # Пишем во временный файл и подменяем, чтобы не оставить битый артефакт
+    tmp_path = f'{path}.tmp'
+    joblib.dump(state, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info('Feature state v%s saved to %s', state['version'], path)
+
+
+def load_feature_state(path=FEATURE_STATE_PATH):
+    state = joblib.load(path)
+    if state.get('version') != FEATURE_STATE_VERSION:
+        raise ValueError(
+            f"Feature state {path} has version {state.get('version')}, expected {FEATURE_STATE_VERSION}. "
+            f"Refit it with src/fit_feature_state.py"
+        )
+    logger.info('Feature state v%s loaded from %s (created at %s)', state['version'], path, state['created_at'])
+    return state
+
+
+def get_feature_state(model_features, threshold, path=FEATURE_STATE_PATH):
+    if os.path.exists(path):
+        return load_feature_state(path)
+
+    logger.info('Feature state not found at %s, fitting on training data...', path)
+    state = fit_feature_state(model_features, threshold)
+    save_feature_state(state, path)
+    return state
+
+
+def run_preproc(state, test_df, aggregates=None):
+    # aggregates - дневные агрегаты по всему файлу (потоковый режим); по умолчанию считаются по test_df
+    test_df = process_transaction_time_features(test_df)
+    test_df = process_distance_features(test_df)
+    test_df = process_amount_and_night_features(test_df, aggregates)
+    test_df = process_gender_daily_stats(test_df, aggregates['gender'] if aggregates else None)
+    test_df = process_catboost_encoding(test_df, state['encoder'])
+    return test_df
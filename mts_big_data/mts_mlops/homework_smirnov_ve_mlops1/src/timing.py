@@ -0,0 +1,32 @@
+# Замер времени этапов пайплайна
+
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def stage_timer(name: str, timings: dict):
+    """Засекает время выполнения этапа и пишет его в timings[name] (секунды)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = time.perf_counter() - start
+        logger.info('Stage %s finished in %.3f s', name, timings[name])
+
+
+def report_timings(timings: dict, json_path=None):
+    """Выводит сводку по этапам и, если задан путь, сохраняет её в JSON."""
+    total = sum(timings.values())
+    logger.info('Stage timings (total %.3f s):', total)
+    for name, seconds in timings.items():
+        share = seconds / total * 100 if total else 0
+        logger.info('  %-20s %9.3f s  %5.1f%%', name, seconds, share)
+
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump({**timings, 'total': total}, f, ensure_ascii=False, indent=2)
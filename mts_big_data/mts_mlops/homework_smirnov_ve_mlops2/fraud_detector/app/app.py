@@ -1,105 +1,514 @@
-import os
-import sys
-import pandas as pd
-import logging
-import json
-import traceback
-
-from confluent_kafka import Consumer, Producer
-
-sys.path.append(os.path.abspath('./src'))
-
-from preprocessing import load_train_data, run_preproc
-from scorer import make_pred
-
-# Логирование
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/service.log'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-# Переменные окружения
-KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
-TRANSACTIONS_TOPIC = os.getenv("KAFKA_TRANSACTIONS_TOPIC", "transactions")
-SCORING_TOPIC = os.getenv("KAFKA_SCORING_TOPIC", "scoring")
-
-class ProcessingService:
-    def __init__(self):
-        self.consumer_config = {
-            'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
-            'group.id': 'ml-scorer',
-            'auto.offset.reset': 'earliest'
-        }
-        self.producer_config = {
-            'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS
-        }
-
-        self.consumer = Consumer(self.consumer_config)
-        self.consumer.subscribe([TRANSACTIONS_TOPIC])
-        self.producer = Producer(self.producer_config)
-
-        # Загрузка обучающего набора, энкодера и признаков модели
-        self.train, self.encoder, self.model_features = load_train_data()
-
-    def process_messages(self):
-        logger.info("Started processing loop.")
-        while True:
-            msg = self.consumer.poll(1.0)
-            if msg is None:
-                continue
-            if msg.error():
-                logger.error(f"Kafka error: {msg.error()}")
-                continue
-
-            try:
-                data = json.loads(msg.value().decode('utf-8'))
-
-                # Проверка корректности данных
-                if 'transaction_id' not in data or 'data' not in data:
-                    raise ValueError("Message must contain 'transaction_id' and 'data' fields.")
-
-                transaction_id = data['transaction_id']
-                input_df = pd.DataFrame([data['data']])
-
-                # Препроцессинг
-                processed_df = run_preproc(
-                    self.train, input_df, self.encoder, self.model_features
-                )
-
-                # Предсказание
-                submission = make_pred(
-                    processed_df, self.model_features, source_info="kafka_stream"
-                )
-                submission['transaction_id'] = transaction_id
-
-                result = {
-                    "score": float(submission["score"].iloc[0]),
-                    "fraud_flag": int(submission["fraud_flag"].iloc[0]),
-                    "transaction_id": transaction_id
-                }
-
-                # Отправка обратно в Kafka
-                self.producer.produce(
-                    SCORING_TOPIC,
-                    value=json.dumps(result).encode('utf-8')
-                )
-                self.producer.flush()
-
-                logger.info(f"Scored transaction {transaction_id}, score={result['score']}, fraud_flag={result['fraud_flag']}")
-
-            except Exception as e:
-                logger.error(f"Error processing message: {e}")
-                logger.debug(traceback.format_exc())
-
-if __name__ == "__main__":
-    logger.info("Starting Kafka ML scoring service...")
-    service = ProcessingService()
-    try:
-        service.process_messages()
-    except KeyboardInterrupt:
-        logger.info("Service stopped by user.")
\ No newline at end of file
+import os
+import sys
+import logging
+import multiprocessing
+import signal
+import time
+import traceback
+
+sys.path.append(os.path.abspath('./src'))
+
+from codec import (
+    SCORING_FORMAT, TRANSACTIONS_FORMAT, check_format, decode_transaction, encode_score, format_headers,
+    message_format,
+)
+from delivery import DeliveryStats, producer_config
+from metrics import METRICS_JSON_PATH, METRICS_PORT, LogSampler, ServiceMetrics, start_metrics_server
+from model_registry import MODEL_REGISTRY_DIR, ModelWatcher
+from offsets import OffsetTracker, TransactionIdCache
+from preprocessing import get_feature_state
+from scorer import model_th, score_batch, score_transaction
+from shadow import SHADOW_MODEL_PATH, SHADOW_OUTPUT_PATH, SHADOW_THRESHOLD, ShadowScorer
+from streaming_aggregates import WindowedDailyAggregator
+from transaction_encoder import TransactionEncoder
+from transport import KafkaTransport
+
+logger = logging.getLogger(__name__)
+
+def setup_logging():
+    # Настраивается только при запуске сервиса, чтобы ProcessingService можно было импортировать в бенчмарках
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('/app/logs/service.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+# Переменные окружения
+KAFKA_BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "kafka:9092")
+TRANSACTIONS_TOPIC = os.getenv("KAFKA_TRANSACTIONS_TOPIC", "transactions")
+SCORING_TOPIC = os.getenv("KAFKA_SCORING_TOPIC", "scoring")
+
+# Режим обработки: single - по одному сообщению, batch - микробатчи
+SCORER_MODE = os.getenv("SCORER_MODE", "single")
+MAX_BATCH_SIZE = int(os.getenv("SCORER_MAX_BATCH_SIZE", "500"))
+MAX_LINGER_MS = int(os.getenv("SCORER_MAX_LINGER_MS", "100"))
+
+# Дневные агрегаты по потоку (нужны модели, обученной на AGGREGATE_FEATURES) и окно хранения дат
+DAILY_AGGREGATES = os.getenv("SCORER_DAILY_AGGREGATES", "0") == "1"
+AGGREGATES_WINDOW_DAYS = int(os.getenv("SCORER_AGGREGATES_WINDOW_DAYS", "2"))
+
+# Число процессов-воркеров в группе ml-scorer (1 - без супервизора) и время на их корректную остановку
+SCORER_WORKERS = int(os.getenv("SCORER_WORKERS", "1"))
+SHUTDOWN_TIMEOUT_S = float(os.getenv("SCORER_SHUTDOWN_TIMEOUT_S", "30"))
+
+# Коммит оффсетов: auto - автокоммит Kafka, manual - только после подтверждения результатов брокером
+COMMIT_MODE = os.getenv("SCORER_COMMIT_MODE", "auto")
+COMMIT_EVERY_N = int(os.getenv("SCORER_COMMIT_EVERY_N", "5000"))
+COMMIT_INTERVAL_MS = int(os.getenv("SCORER_COMMIT_INTERVAL_MS", "1000"))
+# Сколько последних transaction_id помнить для отсечения повторов (0 - не отсекать)
+DEDUP_CACHE_SIZE = int(os.getenv("SCORER_DEDUP_CACHE_SIZE", "100000"))
+
+class ProcessingService:
+    def __init__(self, state=None, transport=None, worker_id=0):
+        self.consumer_config = {
+            'bootstrap.servers': KAFKA_BOOTSTRAP_SERVERS,
+            'group.id': 'ml-scorer',
+            'auto.offset.reset': 'earliest',
+            'enable.auto.commit': COMMIT_MODE != "manual"
+        }
+        # Асинхронный продюсер: linger.ms, batch.num.messages и сжатие задаются переменными окружения
+        self.producer_config = producer_config(KAFKA_BOOTSTRAP_SERVERS)
+
+        # Kafka или брокер в памяти (transport.InMemoryTransport) для бенчмарков
+        self.transport = transport if transport is not None else KafkaTransport()
+        self.consumer = self.transport.consumer(self.consumer_config)
+        self.consumer.subscribe([TRANSACTIONS_TOPIC], on_assign=self.on_assign, on_revoke=self.on_revoke)
+        self.producer = self.transport.producer(self.producer_config)
+        self.delivery_stats = DeliveryStats()
+        self.scoring_headers = format_headers(check_format(SCORING_FORMAT))
+        self.running = True
+
+        # Метрики этапов, лага и скоров; в лог пишется только каждая LOG_SAMPLE_EVERY_N-я транзакция
+        self.metrics = ServiceMetrics(worker_id, self.delivery_stats)
+        self.log_sampler = LogSampler()
+        self.metrics_server = None
+        if METRICS_PORT > 0:
+            try:
+                self.metrics_server = start_metrics_server(self.metrics, METRICS_PORT + worker_id)
+            except OSError as e:
+                logger.error(f"Cannot start metrics endpoint on port {METRICS_PORT + worker_id}: {e}")
+
+        # Оффсеты, ожидающие коммита, и флаг неудачной доставки с последнего коммита
+        self.offsets = OffsetTracker() if COMMIT_MODE == "manual" else None
+        self.delivery_failed = False
+        self.seen_ids = TransactionIdCache(DEDUP_CACHE_SIZE) if DEDUP_CACHE_SIZE > 0 else None
+
+        # Загрузка артефакта с энкодером, признаками модели и порогом (обучается на train.csv только при отсутствии).
+        # Воркеры супервизора получают уже загруженный в родителе артефакт
+        self.state = state if state is not None else get_feature_state(model_th)
+
+        # Состояние дневных агрегатов живет в памяти сервиса и обновляется каждым батчем
+        self.aggregator = WindowedDailyAggregator(window_days=AGGREGATES_WINDOW_DAYS) if DAILY_AGGREGATES else None
+        # Быстрый путь для одиночных сообщений (без дневных агрегатов)
+        self.encoder = TransactionEncoder(self.state)
+        # Бэкенд инференса: None - модель my_catboost.cbm из scorer, иначе - модель из реестра
+        self.backend = None
+        self.model_version = 'default'
+
+        # Горячая замена модели: при старте берется последняя готовая версия реестра,
+        # дальше новые версии загружаются и прогреваются в фоне и подменяются между батчами
+        self.model_watcher = None
+        if MODEL_REGISTRY_DIR:
+            self.model_watcher = ModelWatcher(MODEL_REGISTRY_DIR)
+            self.model_watcher.check()
+            self.swap_model_if_ready()
+            self.model_watcher.start()
+
+        # Теневой скоринг моделью-кандидатом в фоновых потоках, результаты - в отдельный топик/файл
+        self.shadow = None
+        if SHADOW_MODEL_PATH:
+            self.shadow = ShadowScorer(
+                SHADOW_MODEL_PATH,
+                threshold=float(SHADOW_THRESHOLD) if SHADOW_THRESHOLD else self.state['threshold'],
+                producer=self.producer,
+                output_path=SHADOW_OUTPUT_PATH.format(worker=worker_id)
+            )
+        self.metrics.shadow = self.shadow
+
+    def score_single(self, data: dict, timings=None, features=None) -> dict:
+        if self.aggregator is not None:
+            return score_batch(
+                [data], self.state, source_info="kafka_stream", aggregator=self.aggregator, timings=timings,
+                inference_backend=self.backend, features=features
+            )[0]
+        return score_transaction(
+            data, self.encoder, threshold=self.state['threshold'], timings=timings, inference_backend=self.backend,
+            features=features
+        )
+
+    def submit_shadow(self, features: dict, results: list):
+        # Только постановка в очередь: кандидат скорит ту же матрицу признаков в своем пуле потоков
+        if self.shadow is not None and 'X' in features:
+            self.shadow.submit(features['X'], self.state['model_features'], results)
+
+    def swap_model_if_ready(self):
+        # Вызывается только между батчами/сообщениями, поэтому батч целиком скорится одной моделью
+        if self.model_watcher is None:
+            return
+        bundle = self.model_watcher.take()
+        if bundle is None:
+            return
+        self.state, self.encoder, self.backend = bundle.state, bundle.encoder, bundle.backend
+        logger.info(f"Switched model {self.model_version} -> {bundle.version}")
+        self.model_version = bundle.version
+        self.metrics.model_version = bundle.version
+
+    def on_assign(self, consumer, partitions):
+        logger.info(f"Assigned partitions: {[p.partition for p in partitions]}")
+
+    def on_revoke(self, consumer, partitions):
+        # Результаты по отзываемым партициям должны уйти до того, как их заберет другой воркер
+        self.commit(rewind=False)
+        logger.info(f"Revoked partitions: {[p.partition for p in partitions]}")
+
+    def on_delivery(self, err, msg):
+        self.delivery_stats.on_delivery(err, msg)
+        if err is not None:
+            self.delivery_failed = True
+        elif self.seen_ids is not None and msg.key() is not None:
+            self.seen_ids.add(msg.key().decode('utf-8'))
+
+    def commit(self, rewind=True):
+        """
+        Граница коммита: дожидается подтверждения всех отправленных результатов и коммитит
+        оффсеты обработанных сообщений. Если часть результатов не доставлена, оффсеты не коммитятся:
+        при rewind консьюмер возвращается к первому незакоммиченному сообщению и обработает их снова.
+        """
+        self.producer.flush()
+        if self.offsets is None or not self.offsets.count:
+            return
+
+        if self.delivery_failed:
+            logger.error(f"Some results were not delivered, {self.offsets.count} messages will be reprocessed")
+            if rewind:
+                for tp in self.offsets.rewind_offsets():
+                    self.consumer.seek(tp)
+        else:
+            self.consumer.commit(offsets=self.offsets.commit_offsets(), asynchronous=False)
+            logger.debug(f"Committed offsets for {self.offsets.count} messages")
+
+        self.offsets.reset()
+        self.delivery_failed = False
+
+    def commit_if_due(self):
+        if self.offsets is not None and self.offsets.due(COMMIT_EVERY_N, COMMIT_INTERVAL_MS / 1000):
+            self.commit()
+
+    def is_duplicate(self, data: dict) -> bool:
+        # Повтор уже доставленной транзакции (например, при повторном чтении после сбоя)
+        if self.seen_ids is not None and data['transaction_id'] in self.seen_ids:
+            self.metrics.inc('duplicates')
+            logger.debug(f"Skipping duplicate transaction {data['transaction_id']}")
+            return True
+        return False
+
+    def update_lag(self):
+        # Лаг - сообщений между позицией консьюмера и концом партиции; границы партиций берутся
+        # из последних ответов брокера (cached=True), без отдельных запросов
+        lag = {}
+        for tp in self.consumer.position(self.consumer.assignment()):
+            watermarks = self.consumer.get_watermark_offsets(tp, cached=True)
+            if watermarks is None or tp.offset < 0 or watermarks[1] < 0:
+                continue
+            lag[(tp.topic, tp.partition)] = max(watermarks[1] - tp.offset, 0)
+        self.metrics.set_lag(lag)
+
+    def update_metrics_if_due(self):
+        if not self.metrics.due():
+            return
+        try:
+            self.update_lag()
+            if METRICS_JSON_PATH:
+                self.metrics.dump_json(METRICS_JSON_PATH)
+        except Exception as e:
+            logger.warning(f"Cannot update metrics: {e}")
+
+    def housekeeping(self):
+        # Колбэки доставки, сводка по доставке, коммит оффсетов и метрики - между сообщениями/батчами
+        self.producer.poll(0)
+        self.delivery_stats.log_if_due(self.producer)
+        self.commit_if_due()
+        self.update_metrics_if_due()
+        self.swap_model_if_ready()
+
+    def stop(self, signum=None, frame=None):
+        # Обработчик SIGTERM/SIGINT: цикл завершит текущий батч и выйдет
+        self.running = False
+
+    def close(self):
+        if self.model_watcher is not None:
+            self.model_watcher.stop()
+        if self.shadow is not None:
+            self.shadow.close()
+        self.commit(rewind=False)
+        self.delivery_stats.log_if_due(self.producer, force=True)
+        logger.info(f"Message counters: {self.metrics.counters}")
+        if self.metrics_server is not None:
+            self.metrics_server.shutdown()
+        # close() фиксирует оффсеты и выходит из группы, партиции сразу перераспределяются
+        self.consumer.close()
+        logger.info("Consumer closed.")
+
+    def run(self):
+        try:
+            if SCORER_MODE == "batch":
+                self.process_batches()
+            else:
+                self.process_messages()
+        finally:
+            self.close()
+
+    def send(self, result: dict):
+        # produce() не ждет брокера: сообщение уходит в очередь продюсера, итог доставки - в delivery_stats
+        value = encode_score(result, SCORING_FORMAT)
+        while True:
+            try:
+                self.producer.produce(
+                    SCORING_TOPIC, key=result['transaction_id'], value=value, headers=self.scoring_headers,
+                    on_delivery=self.on_delivery
+                )
+                break
+            except BufferError:
+                # Локальная очередь заполнена: ждем подтверждений от брокера
+                self.producer.poll(0.1)
+        # Обслуживание колбэков доставки без блокировки
+        self.producer.poll(0)
+
+    @staticmethod
+    def decode_message(msg) -> dict:
+        # Формат - из заголовка сообщения, без заголовка - формат топика transactions
+        fmt = message_format(msg.headers(), TRANSACTIONS_FORMAT)
+        data = decode_transaction(msg.value(), fmt)
+
+        # Проверка корректности данных
+        if 'transaction_id' not in data or 'data' not in data:
+            raise ValueError("Message must contain 'transaction_id' and 'data' fields.")
+
+        return data
+
+    def process_messages(self):
+        logger.info("Started processing loop.")
+        while self.running:
+            msg = self.consumer.poll(1.0)
+            self.housekeeping()
+            if msg is None:
+                continue
+            if msg.error():
+                logger.error(f"Kafka error: {msg.error()}")
+                continue
+
+            # Сообщение считается обработанным и при ошибке скоринга, чтобы битое сообщение не блокировало партицию
+            if self.offsets is not None:
+                self.offsets.track(msg)
+            self.metrics.inc('consumed')
+
+            data = None
+            try:
+                start = time.perf_counter()
+                data = self.decode_message(msg)
+                timings = {'decode': time.perf_counter() - start}
+                if self.is_duplicate(data):
+                    continue
+                if self.model_watcher is not None:
+                    self.model_watcher.add_samples([data])
+                features = {}
+                result = self.score_single(data, timings, features)
+
+                # Отправка обратно в Kafka
+                start = time.perf_counter()
+                self.send(result)
+                timings['produce'] = time.perf_counter() - start
+                self.submit_shadow(features, [result])
+
+                self.metrics.observe_stages(timings)
+                self.metrics.observe_scores([result])
+                if self.log_sampler.should_log():
+                    logger.info(
+                        f"Scored transaction {result['transaction_id']}, score={result['score']}, "
+                        f"fraud_flag={result['fraud_flag']} (scored total: {self.metrics.counters['scored']})"
+                    )
+
+            except Exception as e:
+                self.metrics.inc('decode_errors' if data is None else 'score_errors')
+                logger.error(f"Error processing message: {e}")
+                logger.debug(traceback.format_exc())
+
+    def score_one_by_one(self, payloads: list) -> list:
+        # Запасной путь: если батч целиком не проскорился, изолируем битые сообщения
+        results = []
+        for data in payloads:
+            try:
+                results.append(self.score_single(data))
+            except Exception as e:
+                self.metrics.inc('score_errors')
+                logger.error(f"Error processing transaction {data.get('transaction_id')}: {e}")
+                logger.debug(traceback.format_exc())
+        return results
+
+    def process_batches(self):
+        logger.info(f"Started micro-batch loop (max_batch_size={MAX_BATCH_SIZE}, max_linger_ms={MAX_LINGER_MS}).")
+        while self.running:
+            # Ждем, пока наберется MAX_BATCH_SIZE сообщений, но не дольше MAX_LINGER_MS
+            msgs = self.consumer.consume(num_messages=MAX_BATCH_SIZE, timeout=MAX_LINGER_MS / 1000)
+            self.housekeeping()
+            if not msgs:
+                continue
+            self.metrics.inc('consumed', len(msgs))
+
+            start = time.perf_counter()
+            payloads = []
+            for msg in msgs:
+                if msg.error():
+                    logger.error(f"Kafka error: {msg.error()}")
+                    continue
+                if self.offsets is not None:
+                    self.offsets.track(msg)
+                try:
+                    data = self.decode_message(msg)
+                    if not self.is_duplicate(data):
+                        payloads.append(data)
+                except Exception as e:
+                    self.metrics.inc('decode_errors')
+                    logger.error(f"Error decoding message: {e}")
+                    logger.debug(traceback.format_exc())
+            timings = {'decode': time.perf_counter() - start}
+
+            if not payloads:
+                continue
+            if self.model_watcher is not None:
+                self.model_watcher.add_samples(payloads)
+
+            features = {}
+            try:
+                results = score_batch(
+                    payloads, self.state, source_info="kafka_stream", aggregator=self.aggregator, timings=timings,
+                    inference_backend=self.backend, features=features
+                )
+            except Exception as e:
+                logger.error(f"Error processing batch of {len(payloads)} messages: {e}")
+                logger.debug(traceback.format_exc())
+                # Результаты поштучного перескоринга не соответствуют строкам матрицы батча
+                features.clear()
+                results = self.score_one_by_one(payloads)
+
+            # Отправка без flush: продюсер сам собирает сообщения в пачки
+            start = time.perf_counter()
+            for result in results:
+                self.send(result)
+            timings['produce'] = time.perf_counter() - start
+            self.submit_shadow(features, results)
+
+            # Время этапов - на батч целиком
+            self.metrics.observe_stages(timings)
+            self.metrics.observe_batch(len(payloads))
+            self.metrics.observe_scores(results)
+            if self.log_sampler.should_log(len(results)):
+                logger.info(f"Scored batch of {len(results)} transactions (scored total: {self.metrics.counters['scored']})")
+
+def run_worker(state, worker_id):
+    # Consumer и Producer создаются уже в дочернем процессе: librdkafka нельзя переносить через fork
+    service = ProcessingService(state, worker_id=worker_id)
+    signal.signal(signal.SIGTERM, service.stop)
+    signal.signal(signal.SIGINT, service.stop)
+    service.run()
+
+class Supervisor:
+    """
+    Запускает n_workers процессов в одной группе ml-scorer: Kafka сама делит между ними партиции
+    и перераспределяет их при старте, падении или остановке воркера.
+    Модель (загружается при импорте scorer) и артефакт препроцессинга загружаются в супервизоре
+    до fork, поэтому воркеры разделяют их память copy-on-write, а не грузят каждый заново.
+    """
+
+    def __init__(self, n_workers: int):
+        self.n_workers = n_workers
+        self.state = get_feature_state(model_th)
+        self.context = multiprocessing.get_context('fork')
+        self.workers = {}
+        self.stopping = False
+
+    def start_worker(self, worker_id: int):
+        process = self.context.Process(target=run_worker, args=(self.state, worker_id), name=f"worker-{worker_id}")
+        process.start()
+        self.workers[worker_id] = process
+        logger.info(f"Started worker-{worker_id} (pid={process.pid})")
+
+    def update_lag(self):
+        # Лаг - сообщений между позицией консьюмера и концом партиции; границы партиций берутся
+        # из последних ответов брокера (cached=True), без отдельных запросов
+        lag = {}
+        for tp in self.consumer.position(self.consumer.assignment()):
+            watermarks = self.consumer.get_watermark_offsets(tp, cached=True)
+            if watermarks is None or tp.offset < 0 or watermarks[1] < 0:
+                continue
+            lag[(tp.topic, tp.partition)] = max(watermarks[1] - tp.offset, 0)
+        self.metrics.set_lag(lag)
+
+    def update_metrics_if_due(self):
+        if not self.metrics.due():
+            return
+        try:
+            self.update_lag()
+            if METRICS_JSON_PATH:
+                self.metrics.dump_json(METRICS_JSON_PATH)
+        except Exception as e:
+            logger.warning(f"Cannot update metrics: {e}")
+
+    def housekeeping(self):
+        # Колбэки доставки, сводка по доставке, коммит оффсетов и метрики - между сообщениями/батчами
+        self.producer.poll(0)
+        self.delivery_stats.log_if_due(self.producer)
+        self.commit_if_due()
+        self.update_metrics_if_due()
+        self.swap_model_if_ready()
+
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for worker_id in range(self.n_workers):
+            self.start_worker(worker_id)
+
+        # Упавший воркер перезапускается; его партиции на это время забирают остальные
+        while not self.stopping:
+            time.sleep(1)
+            for worker_id, process in list(self.workers.items()):
+                if not process.is_alive() and not self.stopping:
+                    logger.error(f"worker-{worker_id} exited with code {process.exitcode}, restarting")
+                    self.start_worker(worker_id)
+
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Stopping workers...")
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT_S
+        for worker_id, process in self.workers.items():
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.error(f"worker-{worker_id} did not stop in {SHUTDOWN_TIMEOUT_S} s, killing")
+                process.kill()
+                process.join()
+        logger.info("All workers stopped.")
+
+if __name__ == "__main__":
+    setup_logging()
+    logger.info("Starting Kafka ML scoring service...")
+    if SCORER_WORKERS > 1:
+        Supervisor(SCORER_WORKERS).run()
+    else:
+        service = ProcessingService()
+        signal.signal(signal.SIGTERM, service.stop)
+        try:
+            service.run()
+        except KeyboardInterrupt:
+            logger.info("Service stopped by user.")
@@ -0,0 +1,82 @@
+"""
+Бенчмарк форматов сообщений: размер сообщения (байт) и скорость кодирования/декодирования
+(сообщений/сек) для топиков transactions и scoring в форматах из codec.FORMATS.
+
+Транзакции берутся из CSV и кодируются так же, как в interface/app.py; результаты скоринга -
+со случайными скорами, в том виде, в каком их отправляет ProcessingService.
+Модель не нужна, замеряется только сериализация.
+
+Запуск из директории fraud_detector (рядом с src/):
+    python benchmarks/bench_codec.py --input ./fraud_detector/train_data/train.csv --rows 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from codec import FORMATS, decode_score, decode_transaction, encode_score, encode_transaction
+
+
+def build_transactions(df: pd.DataFrame) -> list:
+    df = df.drop(columns=['target'], errors='ignore')
+    return [{"transaction_id": str(uuid.uuid4()), "data": record} for record in df.to_dict(orient='records')]
+
+
+def build_scores(transactions: list) -> list:
+    scores = np.random.default_rng(0).random(len(transactions))
+    return [
+        {"score": float(score), "fraud_flag": int(score > 0.5), "transaction_id": message['transaction_id']}
+        for score, message in zip(scores, transactions)
+    ]
+
+
+def measure(messages: list, encode, decode, fmt: str, repeats: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        encoded = [encode(message, fmt) for message in messages]
+    encode_rate = repeats * len(messages) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        [decode(raw, fmt) for raw in encoded]
+    decode_rate = repeats * len(messages) / (time.perf_counter() - start)
+
+    return {
+        'bytes': sum(len(raw) for raw in encoded) / len(encoded),
+        'encode': encode_rate,
+        'decode': decode_rate,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='./fraud_detector/train_data/train.csv', help='CSV с транзакциями')
+    parser.add_argument('--rows', type=int, default=20000, help='Сколько строк закодировать')
+    parser.add_argument('--repeats', type=int, default=3, help='Повторов замера')
+    args = parser.parse_args()
+
+    transactions = build_transactions(pd.read_csv(args.input, nrows=args.rows))
+    topics = [
+        ('transactions', transactions, encode_transaction, decode_transaction),
+        ('scoring', build_scores(transactions), encode_score, decode_score),
+    ]
+
+    print(f"{'topic':>12} | {'format':>8} | {'bytes/msg':>9} | {'encode msgs/s':>13} | {'decode msgs/s':>13}")
+    for topic, messages, encode, decode in topics:
+        for fmt in FORMATS:
+            stats = measure(messages, encode, decode, fmt, args.repeats)
+            print(
+                f"{topic:>12} | {fmt:>8} | {stats['bytes']:>9.1f} | "
+                f"{stats['encode']:>13.0f} | {stats['decode']:>13.0f}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Бенчмарк микробатчинга: пропускная способность (сообщений/сек) в зависимости от размера батча.
+
+Сообщения формируются так же, как в interface/app.py (transaction_id и data в формате --format),
+каждое декодируется, скорится через score_batch и кодируется обратно в том же формате,
+то есть измеряется весь путь сообщения внутри ProcessingService, кроме сети.
+
+Запуск из директории fraud_detector (рядом с models/ и src/):
+    python benchmarks/bench_micro_batch.py --input ./fraud_detector/train_data/train.csv --rows 5000
+С --daily-aggregates сообщения дополнительно проходят через WindowedDailyAggregator.
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+import uuid
+
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from codec import FORMATS, decode_transaction, encode_score, encode_transaction
+from preprocessing import get_feature_state
+from scorer import model_th, score_batch
+from streaming_aggregates import WindowedDailyAggregator
+
+
+def build_messages(df: pd.DataFrame, fmt: str) -> list:
+    df = df.drop(columns=['target'], errors='ignore')
+    return [
+        encode_transaction({"transaction_id": str(uuid.uuid4()), "data": record}, fmt)
+        for record in df.to_dict(orient='records')
+    ]
+
+
+def run(messages: list, batch_size: int, state: dict, fmt: str, daily_aggregates: bool = False) -> float:
+    aggregator = WindowedDailyAggregator() if daily_aggregates else None
+    start = time.perf_counter()
+    for i in range(0, len(messages), batch_size):
+        payloads = [decode_transaction(raw, fmt) for raw in messages[i:i + batch_size]]
+        results = score_batch(payloads, state, source_info="benchmark", aggregator=aggregator)
+        [encode_score(result, fmt) for result in results]
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='./fraud_detector/train_data/train.csv', help='CSV с транзакциями')
+    parser.add_argument('--rows', type=int, default=5000, help='Сколько строк прогнать через скорер')
+    parser.add_argument('--batch-sizes', default='1,10,50,100,500,1000', help='Размеры батчей через запятую')
+    parser.add_argument('--daily-aggregates', action='store_true', help='Считать дневные агрегаты в окне')
+    parser.add_argument('--format', choices=FORMATS, default='json', help='Формат сообщений в топиках')
+    args = parser.parse_args()
+
+    state = get_feature_state(model_th)
+    # Логи на каждый батч искажают замер
+    logging.getLogger().setLevel(logging.WARNING)
+
+    messages = build_messages(pd.read_csv(args.input, nrows=args.rows), args.format)
+
+    print(f"{'batch_size':>10} | {'msg/sec':>10}")
+    for batch_size in [int(x) for x in args.batch_sizes.split(',')]:
+        throughput = run(messages, batch_size, state, args.format, args.daily_aggregates)
+        print(f"{batch_size:>10} | {throughput:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Сквозной бенчмарк ProcessingService без Kafka: CSV проигрывается в топик transactions брокера
+в памяти (transport.InMemoryBroker), сервис читает, скорит и отправляет результаты в scoring
+тем же кодом, что и с Kafka. Выводится пропускная способность и задержка от записи транзакции
+в transactions до отправки ее скора в scoring (p50/p95/p99).
+
+Без --rate все сообщения записываются сразу (замер максимальной пропускной способности,
+задержка включает ожидание в очереди); с --rate транзакции поступают с заданной скоростью.
+
+Запуск из директории fraud_detector (рядом с models/ и src/):
+    python benchmarks/bench_replay.py --input ./fraud_detector/train_data/train.csv --rows 20000 --mode batch
+"""
+
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'app')))
+
+
+def build_messages(df: pd.DataFrame, fmt: str) -> list:
+    from codec import encode_transaction
+
+    df = df.drop(columns=['target'], errors='ignore')
+    messages = []
+    for record in df.to_dict(orient='records'):
+        transaction_id = str(uuid.uuid4())
+        messages.append((transaction_id, encode_transaction({"transaction_id": transaction_id, "data": record}, fmt)))
+    return messages
+
+
+def feed(broker, topic: str, messages: list, headers: list, rate: float, sent_at: dict):
+    start = time.perf_counter()
+    for i, (transaction_id, value) in enumerate(messages):
+        if rate > 0:
+            delay = start + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        sent_at[transaction_id] = broker.append(topic, None, value, headers).created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='./fraud_detector/train_data/train.csv', help='CSV с транзакциями')
+    parser.add_argument('--rows', type=int, default=20000, help='Сколько строк проиграть')
+    parser.add_argument('--mode', choices=['single', 'batch'], default='batch', help='SCORER_MODE')
+    parser.add_argument('--batch-size', type=int, default=500, help='SCORER_MAX_BATCH_SIZE')
+    parser.add_argument('--linger-ms', type=int, default=100, help='SCORER_MAX_LINGER_MS')
+    parser.add_argument('--commit-mode', choices=['auto', 'manual'], default='manual', help='SCORER_COMMIT_MODE')
+    parser.add_argument('--format', choices=['json', 'msgpack'], default='json', help='Формат обоих топиков')
+    parser.add_argument('--partitions', type=int, default=3, help='Партиций в топиках')
+    parser.add_argument('--rate', type=float, default=0, help='Транзакций/сек на входе, 0 - все сразу')
+    parser.add_argument('--timeout', type=float, default=600, help='Максимальное время прогона, с')
+    args = parser.parse_args()
+
+    # Сервис читает настройки из окружения при импорте
+    os.environ.update({
+        'SCORER_MODE': args.mode,
+        'SCORER_MAX_BATCH_SIZE': str(args.batch_size),
+        'SCORER_MAX_LINGER_MS': str(args.linger_ms),
+        'SCORER_COMMIT_MODE': args.commit_mode,
+        'KAFKA_TRANSACTIONS_FORMAT': args.format,
+        'KAFKA_SCORING_FORMAT': args.format,
+        'SCORER_METRICS_PORT': '0',
+    })
+    from app import SCORING_TOPIC, TRANSACTIONS_TOPIC, ProcessingService
+    from codec import format_headers
+    from preprocessing import get_feature_state
+    from scorer import model_th
+    from transport import InMemoryBroker, InMemoryTransport
+
+    state = get_feature_state(model_th)
+    # Логи на каждое сообщение искажают замер
+    logging.getLogger().setLevel(logging.WARNING)
+
+    messages = build_messages(pd.read_csv(args.input, nrows=args.rows), args.format)
+    broker = InMemoryBroker(num_partitions=args.partitions)
+    service = ProcessingService(state, transport=InMemoryTransport(broker))
+    service_thread = threading.Thread(target=service.run)
+    service_thread.start()
+
+    sent_at = {}
+    feed_thread = threading.Thread(
+        target=feed, args=(broker, TRANSACTIONS_TOPIC, messages, format_headers(args.format), args.rate, sent_at)
+    )
+    feed_thread.start()
+
+    deadline = time.monotonic() + args.timeout
+    while broker.size(SCORING_TOPIC) < len(messages) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    feed_thread.join()
+    service.stop()
+    service_thread.join()
+
+    scored = [msg for log in broker.partitions(SCORING_TOPIC) for msg in log]
+    if len(scored) < len(messages):
+        print(f"Timeout: scored {len(scored)} of {len(messages)} messages")
+    if not scored:
+        return
+
+    latencies_ms = 1000 * np.array([msg.created - sent_at[msg.key().decode('utf-8')] for msg in scored])
+    elapsed = max(msg.created for msg in scored) - min(sent_at.values())
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    print(
+        f"mode={args.mode}, batch_size={args.batch_size}, linger_ms={args.linger_ms}, format={args.format}, "
+        f"rate={args.rate or 'max'}"
+    )
+    print(f"{'messages':>10} | {'msg/sec':>10} | {'p50 ms':>8} | {'p95 ms':>8} | {'p99 ms':>8}")
+    print(f"{len(scored):>10} | {len(scored) / elapsed:>10.1f} | {p50:>8.2f} | {p95:>8.2f} | {p99:>8.2f}")
+
+    # Среднее время этапов по метрикам сервиса (на батч в режиме batch, на сообщение в single)
+    print(f"{'stage':>10} | {'calls':>8} | {'avg ms':>8}")
+    for stage, hist in service.metrics.stages.items():
+        if hist.count:
+            print(f"{stage:>10} | {hist.count:>8} | {1000 * hist.sum / hist.count:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
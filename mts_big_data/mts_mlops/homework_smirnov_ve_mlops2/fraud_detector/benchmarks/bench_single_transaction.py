@@ -0,0 +1,82 @@
+"""
+Бенчмарк задержки на одну транзакцию: run_preproc на DataFrame из одной строки
+против TransactionEncoder (словарь -> numpy-строка).
+
+Для каждой транзакции отдельно замеряется время получения признаков и время
+признаков вместе с predict_proba; выводятся p50/p99 в микросекундах.
+Перед замером проверяется, что оба пути дают одинаковые признаки.
+
+Запуск из директории fraud_detector (рядом с models/ и src/):
+    python benchmarks/bench_single_transaction.py --input ./fraud_detector/train_data/train.csv --rows 2000
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+
+from preprocessing import get_feature_state, run_preproc
+from scorer import model, model_th
+from transaction_encoder import TransactionEncoder
+
+
+def pandas_features(state, data):
+    return run_preproc(state, pd.DataFrame([data]))
+
+
+def fast_features(encoder, data):
+    return encoder.encode(data)
+
+
+def pandas_score(state, data):
+    return model.predict_proba(run_preproc(state, pd.DataFrame([data])))[0, 1]
+
+
+def fast_score(encoder, data):
+    return model.predict_proba(encoder.encode(data).reshape(1, -1))[0, 1]
+
+
+def latencies_us(func, arg, records):
+    timings = np.empty(len(records))
+    for i, data in enumerate(records):
+        start = time.perf_counter()
+        func(arg, data)
+        timings[i] = time.perf_counter() - start
+    return timings * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', default='./fraud_detector/train_data/train.csv', help='CSV с транзакциями')
+    parser.add_argument('--rows', type=int, default=2000, help='Сколько транзакций прогнать')
+    args = parser.parse_args()
+
+    state = get_feature_state(model_th)
+    encoder = TransactionEncoder(state)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    records = pd.read_csv(args.input, nrows=args.rows).drop(columns=['target'], errors='ignore').to_dict(orient='records')
+
+    expected = run_preproc(state, pd.DataFrame(records)).to_numpy(dtype=np.float64)
+    assert np.array_equal(expected, encoder.encode_many(records)), 'Fast path features differ from run_preproc'
+
+    cases = [
+        ('features', 'run_preproc', pandas_features, state),
+        ('features', 'encoder', fast_features, encoder),
+        ('score', 'run_preproc', pandas_score, state),
+        ('score', 'encoder', fast_score, encoder),
+    ]
+    print(f"{'stage':>8} | {'path':>11} | {'p50, us':>9} | {'p99, us':>9}")
+    for stage, path, func, arg in cases:
+        timings = latencies_us(func, arg, records)
+        print(f"{stage:>8} | {path:>11} | {np.percentile(timings, 50):>9.1f} | {np.percentile(timings, 99):>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
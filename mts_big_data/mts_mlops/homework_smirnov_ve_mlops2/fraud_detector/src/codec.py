@@ -0,0 +1,109 @@
+# Формат сообщений в топиках transactions и scoring
+#
+# Копии модуля: fraud_detector/src/codec.py и interface/codec.py (у сервисов разные образы) - файлы должны совпадать.
+#
+# json    - прежний формат: {"transaction_id": ..., "data": {колонка: значение}}
+# msgpack - бинарный формат с фиксированным порядком полей: имена колонок не передаются,
+#           транзакция - массив [transaction_id, [значения по TRANSACTION_FIELDS], {прочие поля} или None];
+#           если каких-то колонок нет, вместо списка значений None, а все поля идут в словаре
+#           скор - массив [transaction_id, score, fraud_flag]
+#
+# Формат задается отдельно для каждого топика; продюсер пишет его в заголовок сообщения 'format',
+# консьюмер декодирует по заголовку, а для сообщений без заголовка берет формат топика.
+
+import json
+import os
+
+import msgpack
+
+FORMATS = ('json', 'msgpack')
+FORMAT_HEADER = 'format'
+
+TRANSACTIONS_FORMAT = os.getenv("KAFKA_TRANSACTIONS_FORMAT", "json")
+SCORING_FORMAT = os.getenv("KAFKA_SCORING_FORMAT", "json")
+
+# Колонки транзакции в порядке входного CSV
+TRANSACTION_FIELDS = [
+    'transaction_time',
+    'merch',
+    'cat_id',
+    'amount',
+    'name_1',
+    'name_2',
+    'gender',
+    'street',
+    'one_city',
+    'us_state',
+    'post_code',
+    'lat',
+    'lon',
+    'population_city',
+    'jobs',
+    'merchant_lat',
+    'merchant_lon',
+]
+TRANSACTION_FIELD_SET = frozenset(TRANSACTION_FIELDS)
+
+
+def _default(value):
+    # numpy-скаляры (np.int64 и т.п.) из pandas
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def check_format(fmt: str) -> str:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown message format '{fmt}', expected one of {FORMATS}")
+    return fmt
+
+
+def format_headers(fmt: str) -> list:
+    return [(FORMAT_HEADER, fmt.encode('utf-8'))]
+
+
+def message_format(headers, default: str) -> str:
+    """Формат сообщения по заголовкам Kafka (список пар (ключ, значение)) или формат топика."""
+    for key, value in headers or []:
+        if key == FORMAT_HEADER:
+            return check_format(value.decode('utf-8') if isinstance(value, bytes) else value)
+    return default
+
+
+def encode_transaction(message: dict, fmt: str) -> bytes:
+    """message - {"transaction_id": ..., "data": {колонка: значение}}."""
+    if fmt == 'json':
+        return json.dumps(message, default=_default).encode('utf-8')
+
+    data = message['data']
+    if TRANSACTION_FIELD_SET <= data.keys():
+        values = [data[field] for field in TRANSACTION_FIELDS]
+        extra = {key: value for key, value in data.items() if key not in TRANSACTION_FIELD_SET} or None
+    else:
+        values, extra = None, data
+    return msgpack.packb([message['transaction_id'], values, extra], default=_default)
+
+
+def decode_transaction(raw: bytes, fmt: str) -> dict:
+    if fmt == 'json':
+        return json.loads(raw.decode('utf-8'))
+
+    transaction_id, values, extra = msgpack.unpackb(raw)
+    data = dict(zip(TRANSACTION_FIELDS, values)) if values is not None else {}
+    if extra:
+        data.update(extra)
+    return {"transaction_id": transaction_id, "data": data}
+
+
+def encode_score(result: dict, fmt: str) -> bytes:
+    """result - {"score": ..., "fraud_flag": ..., "transaction_id": ...}."""
+    if fmt == 'json':
+        return json.dumps(result).encode('utf-8')
+    return msgpack.packb([result['transaction_id'], result['score'], result['fraud_flag']])
+
+
+def decode_score(raw: bytes, fmt: str) -> dict:
+    if fmt == 'json':
+        return json.loads(raw.decode('utf-8'))
+    transaction_id, score, fraud_flag = msgpack.unpackb(raw)
+    return {"score": score, "fraud_flag": fraud_flag, "transaction_id": transaction_id}
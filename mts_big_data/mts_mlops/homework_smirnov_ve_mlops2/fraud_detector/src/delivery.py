@@ -0,0 +1,74 @@
+# Асинхронная отправка результатов скоринга
+#
+# produce() только кладет сообщение в очередь librdkafka; сообщения собираются в пачки
+# (linger.ms, batch.num.messages), сжимаются и отправляются в фоне, а о результате доставки
+# продюсер сообщает колбэком из poll()/flush(). Здесь - конфиг продюсера из переменных
+# окружения и счетчики доставки.
+
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+PRODUCER_LINGER_MS = int(os.getenv("KAFKA_PRODUCER_LINGER_MS", "20"))
+PRODUCER_BATCH_NUM_MESSAGES = int(os.getenv("KAFKA_PRODUCER_BATCH_NUM_MESSAGES", "10000"))
+PRODUCER_COMPRESSION = os.getenv("KAFKA_PRODUCER_COMPRESSION", "lz4")
+# Как часто писать в лог сводку по доставке, с
+DELIVERY_STATS_INTERVAL_S = float(os.getenv("DELIVERY_STATS_INTERVAL_S", "30"))
+
+
+def producer_config(bootstrap_servers: str) -> dict:
+    return {
+        'bootstrap.servers': bootstrap_servers,
+        'linger.ms': PRODUCER_LINGER_MS,
+        'batch.num.messages': PRODUCER_BATCH_NUM_MESSAGES,
+        'compression.type': PRODUCER_COMPRESSION,
+    }
+
+
+class DeliveryStats:
+    """
+    Счетчики доставки в топик scoring. on_delivery передается в produce(on_delivery=...);
+    колбэки вызываются в потоке, который делает poll()/flush(), поэтому блокировки не нужны.
+    Задержка - от produce() до подтверждения брокером (Message.latency()).
+    """
+
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
+        self.latency_sum_s = 0.0
+        self.latency_max_s = 0.0
+        self.last_log = time.monotonic()
+
+    def on_delivery(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            logger.error(f"Delivery to {msg.topic()} failed: {err}")
+            return
+
+        self.delivered += 1
+        latency = msg.latency() or 0.0
+        self.latency_sum_s += latency
+        self.latency_max_s = max(self.latency_max_s, latency)
+
+    def snapshot(self) -> dict:
+        return {
+            'delivered': self.delivered,
+            'failed': self.failed,
+            'avg_latency_ms': 1000 * self.latency_sum_s / self.delivered if self.delivered else 0.0,
+            'max_latency_ms': 1000 * self.latency_max_s,
+        }
+
+    def log_if_due(self, producer=None, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_log < DELIVERY_STATS_INTERVAL_S:
+            return
+        self.last_log = now
+
+        stats = self.snapshot()
+        in_flight = len(producer) if producer is not None else 0
+        logger.info(
+            f"Delivery stats: delivered={stats['delivered']}, failed={stats['failed']}, in_flight={in_flight}, "
+            f"avg_latency={stats['avg_latency_ms']:.1f} ms, max_latency={stats['max_latency_ms']:.1f} ms"
+        )
@@ -0,0 +1,15 @@
+# Однократное обучение состояния препроцессинга на train.csv и сохранение артефакта.
+# Запуск из корня сервиса (рядом с models/): python src/fit_feature_state.py
+
+import logging
+
+from preprocessing import FEATURE_STATE_PATH, fit_feature_state, save_feature_state
+from scorer import model_th
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+    state = fit_feature_state(model_th)
+    save_feature_state(state, FEATURE_STATE_PATH)
+    logger.info('Done! Scoring will load %s instead of train.csv', FEATURE_STATE_PATH)
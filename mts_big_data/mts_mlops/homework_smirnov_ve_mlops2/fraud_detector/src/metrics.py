@@ -0,0 +1,222 @@
+# Метрики сервиса скоринга
+#
+# Время этапов (decode, preprocess, predict, produce), размеры батчей, распределение скоров,
+# счетчики сообщений и лаг консьюмера по партициям. Отдаются в текстовом формате Prometheus
+# по HTTP (/metrics, JSON - /metrics.json) и/или периодически пишутся в JSON-файл.
+# Обновление метрик - несколько операций на батч или сообщение, без блокировок: HTTP-поток
+# только читает значения.
+
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Порт HTTP-эндпоинта (0 - выключен); у воркеров супервизора - METRICS_PORT + номер воркера
+METRICS_PORT = int(os.getenv("SCORER_METRICS_PORT", "8000"))
+# Файл для периодической выгрузки в JSON ('' - не писать); {worker} заменяется номером воркера
+METRICS_JSON_PATH = os.getenv("SCORER_METRICS_JSON_PATH", "")
+# Как часто обновлять лаг консьюмера и выгружать JSON, с
+METRICS_INTERVAL_S = float(os.getenv("SCORER_METRICS_INTERVAL_S", "10"))
+# В лог попадает одна строка на LOG_SAMPLE_EVERY_N проскоренных транзакций
+LOG_SAMPLE_EVERY_N = int(os.getenv("SCORER_LOG_SAMPLE_EVERY_N", "1000"))
+
+STAGES = ('decode', 'preprocess', 'predict', 'produce')
+STAGE_BUCKETS_S = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BATCH_SIZE_BUCKETS = (1, 5, 10, 50, 100, 250, 500, 1000, 2500, 5000)
+SCORE_BUCKETS = tuple(np.round(np.linspace(0.1, 1.0, 10), 1))
+COUNTERS = ('consumed', 'scored', 'decode_errors', 'score_errors', 'duplicates')
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами le, как histogram в Prometheus."""
+
+    def __init__(self, bounds):
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.counts = np.zeros(len(bounds) + 1, dtype=np.int64)  # последняя корзина - +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[np.searchsorted(self.bounds, value, side='left')] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_many(self, values):
+        values = np.asarray(values, dtype=float)
+        idx = np.searchsorted(self.bounds, values, side='left')
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+        self.sum += float(values.sum())
+        self.count += len(values)
+
+    def cumulative(self) -> list:
+        labels = [repr(float(bound)) for bound in self.bounds] + ['+Inf']
+        return list(zip(labels, np.cumsum(self.counts).tolist()))
+
+    def to_dict(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'buckets': dict(self.cumulative())}
+
+
+class LogSampler:
+    """Разрешает строку лога раз в every_n событий; n - сколько событий (транзакций) прошло."""
+
+    def __init__(self, every_n: int = LOG_SAMPLE_EVERY_N):
+        self.every_n = max(every_n, 1)
+        self.seen = 0
+        self.next = 0
+
+    def should_log(self, n: int = 1) -> bool:
+        self.seen += n
+        if self.seen <= self.next:
+            return False
+        self.next = self.seen + self.every_n - 1
+        return True
+
+
+class ServiceMetrics:
+    def __init__(self, worker_id: int = 0, delivery_stats=None):
+        self.worker_id = worker_id
+        self.delivery_stats = delivery_stats
+        self.stages = {stage: Histogram(STAGE_BUCKETS_S) for stage in STAGES}
+        self.batch_size = Histogram(BATCH_SIZE_BUCKETS)
+        self.scores = Histogram(SCORE_BUCKETS)
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.lag = {}  # (topic, partition) -> сообщений до конца партиции
+        self.model_version = 'default'
+        self.shadow = None  # ShadowScorer, если включен теневой скоринг
+        self.started = time.time()
+        self.last_tick = time.monotonic()
+
+    def observe_stages(self, timings: dict):
+        for stage, seconds in timings.items():
+            self.stages[stage].observe(seconds)
+
+    def observe_batch(self, size: int):
+        self.batch_size.observe(size)
+
+    def observe_scores(self, results: list):
+        self.scores.observe_many([result['score'] for result in results])
+        self.counters['scored'] += len(results)
+
+    def inc(self, counter: str, n: int = 1):
+        self.counters[counter] += n
+
+    def set_lag(self, lag: dict):
+        self.lag = lag
+
+    def due(self) -> bool:
+        now = time.monotonic()
+        if now - self.last_tick < METRICS_INTERVAL_S:
+            return False
+        self.last_tick = now
+        return True
+
+    def snapshot(self) -> dict:
+        snapshot = {
+            'worker': self.worker_id,
+            'model_version': self.model_version,
+            'uptime_s': time.time() - self.started,
+            'counters': dict(self.counters),
+            'stage_seconds': {stage: hist.to_dict() for stage, hist in self.stages.items()},
+            'batch_size': self.batch_size.to_dict(),
+            'score': self.scores.to_dict(),
+            'consumer_lag': {f"{topic}[{partition}]": lag for (topic, partition), lag in self.lag.items()},
+        }
+        if self.delivery_stats is not None:
+            snapshot['delivery'] = self.delivery_stats.snapshot()
+        if self.shadow is not None:
+            snapshot['shadow'] = self.shadow.snapshot()
+        return snapshot
+
+    def render_prometheus(self) -> str:
+        worker = f'worker="{self.worker_id}"'
+        lines = [
+            '# TYPE scorer_model_info gauge',
+            f'scorer_model_info{{{worker},version="{self.model_version}"}} 1',
+            '# TYPE scorer_messages_total counter',
+            *[f'scorer_messages_total{{{worker},kind="{name}"}} {value}' for name, value in self.counters.items()],
+            '# TYPE scorer_stage_seconds histogram',
+        ]
+        for stage, hist in self.stages.items():
+            lines += self.render_histogram('scorer_stage_seconds', hist, f'{worker},stage="{stage}"')
+        lines.append('# TYPE scorer_batch_size histogram')
+        lines += self.render_histogram('scorer_batch_size', self.batch_size, worker)
+        lines.append('# TYPE scorer_score histogram')
+        lines += self.render_histogram('scorer_score', self.scores, worker)
+        lines.append('# TYPE scorer_consumer_lag gauge')
+        lines += [
+            f'scorer_consumer_lag{{{worker},topic="{topic}",partition="{partition}"}} {lag}'
+            for (topic, partition), lag in self.lag.items()
+        ]
+        if self.delivery_stats is not None:
+            delivery = self.delivery_stats.snapshot()
+            lines += [
+                '# TYPE scorer_delivery_total counter',
+                f'scorer_delivery_total{{{worker},result="delivered"}} {delivery["delivered"]}',
+                f'scorer_delivery_total{{{worker},result="failed"}} {delivery["failed"]}',
+                '# TYPE scorer_delivery_latency_avg_seconds gauge',
+                f'scorer_delivery_latency_avg_seconds{{{worker}}} {delivery["avg_latency_ms"] / 1000}',
+            ]
+        if self.shadow is not None:
+            shadow = self.shadow.snapshot()
+            labels = f'{worker},model="{shadow["model_version"]}"'
+            lines += [
+                '# TYPE scorer_shadow_messages_total counter',
+                f'scorer_shadow_messages_total{{{labels},kind="scored"}} {shadow["scored"]}',
+                f'scorer_shadow_messages_total{{{labels},kind="dropped"}} {shadow["dropped"]}',
+                '# TYPE scorer_shadow_agreement_ratio gauge',
+                f'scorer_shadow_agreement_ratio{{{labels}}} {shadow["agreement"]}',
+                '# TYPE scorer_shadow_score_delta gauge',
+                f'scorer_shadow_score_delta{{{labels},stat="mean"}} {shadow["delta_mean"]}',
+                f'scorer_shadow_score_delta{{{labels},stat="std"}} {shadow["delta_std"]}',
+                f'scorer_shadow_score_delta{{{labels},stat="abs_max"}} {shadow["abs_delta_max"]}',
+            ]
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def render_histogram(name: str, hist: Histogram, labels: str) -> list:
+        lines = [f'{name}_bucket{{{labels},le="{le}"}} {count}' for le, count in hist.cumulative()]
+        lines.append(f'{name}_sum{{{labels}}} {hist.sum}')
+        lines.append(f'{name}_count{{{labels}}} {hist.count}')
+        return lines
+
+    def dump_json(self, path: str):
+        path = path.format(worker=self.worker_id)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+
+def start_metrics_server(metrics: ServiceMetrics, port: int) -> ThreadingHTTPServer:
+    """HTTP-эндпоинт в фоновом потоке: /metrics - формат Prometheus, /metrics.json - JSON."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = metrics.render_prometheus(), 'text/plain; version=0.0.4'
+            elif self.path == '/metrics.json':
+                body, content_type = json.dumps(metrics.snapshot()), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            # Запросы сборщика метрик не пишутся в лог сервиса
+            pass
+
+    server = ThreadingHTTPServer(('0.0.0.0', port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics endpoint: http://0.0.0.0:{port}/metrics")
+    return server
@@ -0,0 +1,176 @@
+# Реестр моделей и горячая замена модели без перезапуска сервиса
+#
+# Реестр - директория MODEL_REGISTRY_DIR с версиями в поддиректориях:
+#     <registry>/<version>/model.cbm             - модель CatBoost
+#     <registry>/<version>/feature_state.joblib  - артефакт препроцессинга (энкодер, признаки, порог)
+#     <registry>/<version>/READY                 - создается последним: версия выложена целиком
+# Активна готовая версия с наибольшим именем. ModelWatcher в фоновом потоке опрашивает реестр,
+# загружает новую версию, прогревает ее на последних транзакциях и отдает сервису, который
+# подменяет комплект модели между батчами.
+#
+# Выкладка версии из корня сервиса (рядом с models/):
+#     python src/model_registry.py --model ./models/my_catboost.cbm --state ./models/feature_state.joblib
+
+import argparse
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+from catboost import CatBoostClassifier
+
+from inference import make_backend, to_matrix
+from preprocessing import load_feature_state
+from scorer import score_batch, score_transaction
+from transaction_encoder import TransactionEncoder
+
+logger = logging.getLogger(__name__)
+
+# Директория реестра ('' - горячая замена выключена) и период опроса, с
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "")
+MODEL_REGISTRY_POLL_S = float(os.getenv("MODEL_REGISTRY_POLL_S", "10"))
+# Сколько последних транзакций хранить для прогрева новой модели
+WARMUP_SAMPLE_SIZE = int(os.getenv("MODEL_WARMUP_SAMPLE_SIZE", "256"))
+
+MODEL_FILE = 'model.cbm'
+STATE_FILE = 'feature_state.joblib'
+READY_FILE = 'READY'
+
+
+class ModelBundle:
+    """Комплект для скоринга: модель, бэкенд инференса, артефакт препроцессинга (с порогом) и энкодер."""
+
+    def __init__(self, version: str, backend, state: dict):
+        self.version = version
+        self.backend = backend
+        self.state = state
+        self.encoder = TransactionEncoder(state)
+
+
+def ready_versions(registry_dir: str) -> list:
+    if not os.path.isdir(registry_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(registry_dir)
+        if os.path.exists(os.path.join(registry_dir, name, READY_FILE))
+    )
+
+
+def load_bundle(registry_dir: str, version: str) -> ModelBundle:
+    path = os.path.join(registry_dir, version)
+    model = CatBoostClassifier()
+    model.load_model(os.path.join(path, MODEL_FILE))
+    # ONNX-файл экспортируется рядом с моделью версии
+    backend = make_backend(model, onnx_path=os.path.join(path, 'model.onnx'))
+    return ModelBundle(version, backend, load_feature_state(os.path.join(path, STATE_FILE)))
+
+
+def warm_up(bundle: ModelBundle, payloads: list):
+    """
+    Прогрев и проверка новой модели до подмены: оба пути скоринга на последних транзакциях
+    (или на нулевой строке, если транзакций еще не было). Скоры должны быть вероятностями.
+    """
+    if payloads:
+        results = score_batch(payloads, bundle.state, source_info="warmup", inference_backend=bundle.backend)
+        results.append(score_transaction(
+            payloads[-1], bundle.encoder, threshold=bundle.state['threshold'], inference_backend=bundle.backend
+        ))
+        scores = np.array([result['score'] for result in results])
+    else:
+        X = to_matrix(np.zeros((1, len(bundle.state['model_features']))))
+        scores = np.asarray(bundle.backend.predict_proba(X))
+
+    if not np.all(np.isfinite(scores)) or scores.min() < 0 or scores.max() > 1:
+        raise ValueError(f"Model {bundle.version} returned invalid scores during warm-up")
+
+
+class ModelWatcher:
+    """
+    Фоновый поток: раз в poll_s ищет в реестре новую готовую версию, загружает и прогревает ее.
+    Готовый комплект забирает цикл обработки через take(); версия, которую не удалось загрузить,
+    повторно не загружается.
+    """
+
+    def __init__(self, registry_dir: str, current_version: str = None, poll_s: float = MODEL_REGISTRY_POLL_S):
+        self.registry_dir = registry_dir
+        self.poll_s = poll_s
+        self.current_version = current_version
+        self.failed_versions = set()
+        self.samples = deque(maxlen=WARMUP_SAMPLE_SIZE)
+        self.pending = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="model-watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def add_samples(self, payloads: list):
+        # Вызывается из цикла обработки; deque.extend потокобезопасен
+        self.samples.extend(payloads)
+
+    def take(self):
+        with self.lock:
+            bundle, self.pending = self.pending, None
+        return bundle
+
+    def latest_version(self):
+        versions = [v for v in ready_versions(self.registry_dir) if v not in self.failed_versions]
+        return versions[-1] if versions else None
+
+    def check(self):
+        version = self.latest_version()
+        with self.lock:
+            loaded = self.pending.version if self.pending is not None else self.current_version
+        if version is None or version == loaded:
+            return
+
+        start = time.perf_counter()
+        try:
+            bundle = load_bundle(self.registry_dir, version)
+            warm_up(bundle, list(self.samples))
+        except Exception as e:
+            self.failed_versions.add(version)
+            logger.error(f"Cannot load model {version} from {self.registry_dir}: {e}")
+            return
+
+        with self.lock:
+            self.pending = bundle
+        self.current_version = version
+        logger.info(f"Model {version} loaded and warmed up in {time.perf_counter() - start:.2f} s")
+
+    def run(self):
+        while not self.stopped.wait(self.poll_s):
+            self.check()
+
+
+def publish(registry_dir: str, model_path: str, state_path: str, version: str = None) -> str:
+    """Копирует модель и артефакт в новую версию реестра; READY пишется последним."""
+    version = version or datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')
+    path = os.path.join(registry_dir, version)
+    os.makedirs(path)
+    shutil.copyfile(model_path, os.path.join(path, MODEL_FILE))
+    shutil.copyfile(state_path, os.path.join(path, STATE_FILE))
+    open(os.path.join(path, READY_FILE), 'w').close()
+    return version
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Выкладка модели в реестр')
+    parser.add_argument('--registry', default=MODEL_REGISTRY_DIR or './models/registry', help='Директория реестра')
+    parser.add_argument('--model', required=True, help='Файл модели CatBoost (.cbm)')
+    parser.add_argument('--state', required=True, help='Артефакт препроцессинга (feature_state.joblib)')
+    parser.add_argument('--version', default=None, help='Имя версии (по умолчанию - текущее время UTC)')
+    args = parser.parse_args()
+
+    version = publish(args.registry, args.model, args.state, args.version)
+    logger.info('Published model version %s to %s', version, args.registry)
@@ -0,0 +1,67 @@
+# Ручной коммит оффсетов (at-least-once) и защита от повторного скоринга
+#
+# Оффсет сообщения коммитится только после того, как результаты его скоринга подтверждены
+# брокером. Если сервис упал между скорингом и коммитом, после перезапуска сообщения
+# придут повторно; уже отправленные транзакции отсекаются кэшем transaction_id.
+
+import logging
+import time
+from collections import OrderedDict
+
+from confluent_kafka import TopicPartition
+
+logger = logging.getLogger(__name__)
+
+
+class TransactionIdCache:
+    """Ограниченное LRU-множество transaction_id, результаты по которым доставлены в scoring."""
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.ids = OrderedDict()
+
+    def __contains__(self, transaction_id):
+        return transaction_id in self.ids
+
+    def add(self, transaction_id):
+        self.ids[transaction_id] = None
+        self.ids.move_to_end(transaction_id)
+        if len(self.ids) > self.maxsize:
+            self.ids.popitem(last=False)
+
+
+class OffsetTracker:
+    """
+    Оффсеты обработанных, но еще не закоммиченных сообщений по партициям:
+    следующий оффсет для коммита и первый оффсет для отката, если доставка не удалась.
+    """
+
+    def __init__(self):
+        self.first = {}  # (topic, partition) -> первый необработанный после коммита оффсет
+        self.next = {}   # (topic, partition) -> оффсет, который будет закоммичен
+        self.count = 0
+        self.last_commit = time.monotonic()
+
+    def track(self, msg):
+        key = (msg.topic(), msg.partition())
+        self.first.setdefault(key, msg.offset())
+        self.next[key] = msg.offset() + 1
+        self.count += 1
+
+    def due(self, every_n, interval_s):
+        # Коммит раз в every_n сообщений или раз в interval_s, что наступит раньше
+        if not self.count:
+            return False
+        return self.count >= every_n or time.monotonic() - self.last_commit >= interval_s
+
+    def commit_offsets(self):
+        return [TopicPartition(topic, partition, offset) for (topic, partition), offset in self.next.items()]
+
+    def rewind_offsets(self):
+        return [TopicPartition(topic, partition, offset) for (topic, partition), offset in self.first.items()]
+
+    def reset(self):
+        self.first.clear()
+        self.next.clear()
+        self.count = 0
+        self.last_commit = time.monotonic()
@@ -1,44 +1,106 @@
-import pandas as pd
-import logging
-from catboost import CatBoostClassifier
-from preprocessing import load_train_data, run_preproc
-
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
-logger.info('Importing pretrained model...')
-model = CatBoostClassifier()
-model.load_model('./models/my_catboost.cbm')
-model_th = 0.28
-logger.info('Pretrained model imported successfully...')
-
-
-def make_pred(processed_df: pd.DataFrame, model_features: list, source_info="kafka_stream") -> pd.DataFrame:
-    logger.info(f'Running predictions for source: {source_info}')
-
-    missing_cols = [col for col in model_features if col not in processed_df.columns]
-    if missing_cols:
-        logger.warning(f"Missing columns in input data: {missing_cols}")
-        for col in missing_cols:
-            processed_df[col] = 0
-
-    X = processed_df[model_features]
-    y_proba = model.predict_proba(X)[:, 1]
-    y_pred = (y_proba > model_th).astype(int)
-
-    submission = pd.DataFrame({
-        'score': y_proba,
-        'fraud_flag': y_pred
-    })
-
-    return submission
-
-
-if __name__ == '__main__':
-    logger.info('Running local test inference...')
-    train_df, encoder, model_features = load_train_data()
-    test_df = pd.read_csv("train_data/train.csv")
-    test_df_processed = run_preproc(train_df, test_df, encoder, model_features)
-    submission = make_pred(test_df_processed, model_features, source_info="local")
-    submission.to_csv('/app/output/sample_submission.csv', index=False)
+import pandas as pd
+import logging
+import time
+from catboost import CatBoostClassifier
+from inference import make_backend, to_matrix
+from preprocessing import get_feature_state, run_preproc
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+logger.info('Importing pretrained model...')
+model = CatBoostClassifier()
+model.load_model('./models/my_catboost.cbm')
+model_th = 0.28
+# Бэкенд инференса (INFERENCE_BACKEND: catboost или onnx)
+backend = make_backend(model)
+logger.info('Pretrained model imported successfully...')
+
+
+def make_pred(processed_df: pd.DataFrame, model_features: list, source_info="kafka_stream", threshold=model_th,
+              inference_backend=None, features=None) -> pd.DataFrame:
+    logger.debug(f'Running predictions for source: {source_info}')
+
+    missing_cols = [col for col in model_features if col not in processed_df.columns]
+    if missing_cols:
+        logger.warning(f"Missing columns in input data: {missing_cols}")
+        for col in missing_cols:
+            processed_df[col] = 0
+
+    X = to_matrix(processed_df, model_features)
+    if features is not None:
+        features['X'] = X
+    # inference_backend - бэкенд модели из реестра (model_registry), по умолчанию - my_catboost.cbm
+    y_proba = (inference_backend if inference_backend is not None else backend).predict_proba(X)
+    y_pred = (y_proba > threshold).astype(int)
+
+    submission = pd.DataFrame({
+        'score': y_proba,
+        'fraud_flag': y_pred
+    })
+
+    return submission
+
+
+def score_batch(payloads: list, state: dict, source_info="kafka_stream", aggregator=None, timings=None,
+                inference_backend=None, features=None) -> list:
+    """
+    Скоринг пачки сообщений: один препроцессинг и один вызов predict_proba на весь батч.
+    aggregator - WindowedDailyAggregator с дневными агрегатами потока (None - без них).
+    timings - словарь, куда записывается время этапов preprocess и predict (секунды).
+    features - словарь, куда кладется матрица признаков X в порядке state['model_features'].
+    Возвращает список результатов в порядке входных сообщений.
+    """
+    start = time.perf_counter()
+    input_df = pd.DataFrame([payload['data'] for payload in payloads])
+    processed_df = run_preproc(state, input_df, aggregator)
+    preprocessed = time.perf_counter()
+    submission = make_pred(
+        processed_df, state['model_features'], source_info=source_info, threshold=state['threshold'],
+        inference_backend=inference_backend, features=features
+    )
+    if timings is not None:
+        timings['preprocess'] = preprocessed - start
+        timings['predict'] = time.perf_counter() - preprocessed
+
+    return [
+        {
+            "score": float(score),
+            "fraud_flag": int(fraud_flag),
+            "transaction_id": payload['transaction_id']
+        }
+        for payload, score, fraud_flag in zip(payloads, submission['score'], submission['fraud_flag'])
+    ]
+
+
+def score_transaction(payload: dict, encoder, threshold=model_th, timings=None, inference_backend=None,
+                      features=None) -> dict:
+    """
+    Быстрый путь для одного сообщения: признаки считает TransactionEncoder без pandas,
+    predict_proba вызывается на numpy-строке. Результат совпадает с score_batch([payload], ...).
+    """
+    start = time.perf_counter()
+    row = encoder.encode(payload['data'])
+    encoded = time.perf_counter()
+    X = to_matrix(row)
+    if features is not None:
+        features['X'] = X
+    score = float((inference_backend if inference_backend is not None else backend).predict_proba(X)[0])
+    if timings is not None:
+        timings['preprocess'] = encoded - start
+        timings['predict'] = time.perf_counter() - encoded
+    return {
+        "score": score,
+        "fraud_flag": int(score > threshold),
+        "transaction_id": payload['transaction_id']
+    }
+
+
+if __name__ == '__main__':
+    logger.info('Running local test inference...')
+    state = get_feature_state(model_th)
+    test_df = pd.read_csv("train_data/train.csv")
+    test_df_processed = run_preproc(state, test_df)
+    submission = make_pred(test_df_processed, state['model_features'], source_info="local", threshold=state['threshold'])
+    submission.to_csv('/app/output/sample_submission.csv', index=False)
     logger.info('sample_submission.csv saved.')
\ No newline at end of file
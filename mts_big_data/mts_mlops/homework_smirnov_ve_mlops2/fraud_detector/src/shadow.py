@@ -0,0 +1,192 @@
+# Теневой скоринг: модель-кандидат на живом потоке
+#
+# Основная модель скорит батч как обычно, а матрица признаков того же батча отправляется в пул
+# потоков, где ее скорит модель-кандидат. Основной путь только ставит задачу в очередь; если
+# очередь переполнена, батч пропускается теневой моделью, а не задерживает основную.
+# Результаты кандидата пишутся в отдельный топик и/или JSONL-файл, сравнение с основной
+# моделью (совпадение флагов, разница скоров) считается инкрементально.
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from catboost import CatBoostClassifier
+
+from inference import make_backend
+
+logger = logging.getLogger(__name__)
+
+# Модель-кандидат ('' - теневой скоринг выключен) и ее порог (по умолчанию - порог основной модели)
+SHADOW_MODEL_PATH = os.getenv("SHADOW_MODEL_PATH", "")
+SHADOW_THRESHOLD = os.getenv("SHADOW_THRESHOLD", "")
+# Куда писать результаты кандидата: топик и/или JSONL-файл ({worker} заменяется номером воркера)
+SHADOW_TOPIC = os.getenv("SHADOW_TOPIC", "scoring_shadow")
+SHADOW_OUTPUT_PATH = os.getenv("SHADOW_OUTPUT_PATH", "")
+# Потоки пула, потоки инференса на вызов и сколько батчей может ждать в очереди
+SHADOW_THREADS = int(os.getenv("SHADOW_THREADS", "1"))
+SHADOW_INFERENCE_THREADS = int(os.getenv("SHADOW_INFERENCE_THREADS", "1"))
+SHADOW_MAX_PENDING = int(os.getenv("SHADOW_MAX_PENDING", "8"))
+SHADOW_STATS_INTERVAL_S = float(os.getenv("SHADOW_STATS_INTERVAL_S", "60"))
+
+
+class ShadowStats:
+    """Сравнение кандидата с основной моделью: совпадение флагов и разница скоров (shadow - primary)."""
+
+    def __init__(self):
+        self.scored = 0
+        self.dropped = 0
+        self.agree = 0
+        self.primary_only = 0  # фрод только у основной модели
+        self.shadow_only = 0   # фрод только у кандидата
+        self.delta_sum = 0.0
+        self.delta_sq_sum = 0.0
+        self.abs_delta_max = 0.0
+
+    def update(self, primary_scores, primary_flags, shadow_scores, shadow_flags):
+        delta = shadow_scores - primary_scores
+        self.scored += len(delta)
+        self.agree += int(np.count_nonzero(primary_flags == shadow_flags))
+        self.primary_only += int(np.count_nonzero(primary_flags > shadow_flags))
+        self.shadow_only += int(np.count_nonzero(shadow_flags > primary_flags))
+        self.delta_sum += float(delta.sum())
+        self.delta_sq_sum += float(np.square(delta).sum())
+        self.abs_delta_max = max(self.abs_delta_max, float(np.abs(delta).max(initial=0.0)))
+
+    def snapshot(self) -> dict:
+        n = self.scored
+        mean = self.delta_sum / n if n else 0.0
+        return {
+            'scored': n,
+            'dropped': self.dropped,
+            'agreement': self.agree / n if n else 0.0,
+            'primary_only_fraud': self.primary_only,
+            'shadow_only_fraud': self.shadow_only,
+            'delta_mean': mean,
+            'delta_std': float(np.sqrt(max(self.delta_sq_sum / n - mean ** 2, 0.0))) if n else 0.0,
+            'abs_delta_max': self.abs_delta_max,
+        }
+
+
+class ShadowScorer:
+    """
+    producer - продюсер сервиса (produce() потокобезопасен) или None, если пишем только в файл.
+    Признаки кандидата берутся из матрицы основной модели по именам, поэтому кандидат должен
+    быть обучен на подмножестве признаков основной модели.
+    """
+
+    def __init__(self, model_path: str, threshold: float, producer=None, topic: str = SHADOW_TOPIC,
+                 output_path: str = SHADOW_OUTPUT_PATH):
+        model = CatBoostClassifier()
+        model.load_model(model_path)
+        self.version = os.path.basename(model_path)
+        self.model_features = list(model.feature_names_)
+        self.backend = make_backend(
+            model, thread_count=SHADOW_INFERENCE_THREADS, onnx_path=f"{os.path.splitext(model_path)[0]}.onnx"
+        )
+        self.threshold = threshold
+
+        self.producer = producer if topic else None
+        self.topic = topic
+        self.output = open(output_path, 'a', encoding='utf-8') if output_path else None
+
+        self.stats = ShadowStats()
+        self.columns_cache = {}
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=SHADOW_THREADS, thread_name_prefix="shadow")
+        self.last_log = time.monotonic()
+        logger.info(f"Shadow model {self.version} loaded (threshold={threshold})")
+
+    def columns(self, primary_features: list) -> np.ndarray:
+        # Индексы признаков кандидата в матрице основной модели; считаются один раз на набор признаков
+        key = tuple(primary_features)
+        if key not in self.columns_cache:
+            missing = [f for f in self.model_features if f not in primary_features]
+            if missing:
+                raise ValueError(f"Shadow model needs features missing from the primary model: {missing}")
+            self.columns_cache[key] = np.array([primary_features.index(f) for f in self.model_features])
+        return self.columns_cache[key]
+
+    def submit(self, X: np.ndarray, primary_features: list, results: list):
+        """Ставит батч в очередь; вызывается из цикла обработки после отправки основных результатов."""
+        with self.lock:
+            if self.pending >= SHADOW_MAX_PENDING:
+                self.stats.dropped += len(results)
+                return
+            self.pending += 1
+        self.executor.submit(self.score, X, primary_features, results)
+
+    def score(self, X: np.ndarray, primary_features: list, results: list):
+        try:
+            shadow_scores = np.asarray(self.backend.predict_proba(X[:, self.columns(primary_features)]), dtype=float)
+            shadow_flags = (shadow_scores > self.threshold).astype(int)
+            primary_scores = np.fromiter((r['score'] for r in results), dtype=float, count=len(results))
+            primary_flags = np.fromiter((r['fraud_flag'] for r in results), dtype=int, count=len(results))
+
+            with self.lock:
+                self.stats.update(primary_scores, primary_flags, shadow_scores, shadow_flags)
+            self.write(results, shadow_scores, shadow_flags)
+        except Exception as e:
+            logger.error(f"Shadow scoring failed: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+        self.log_if_due()
+
+    def write(self, results: list, shadow_scores, shadow_flags):
+        if self.producer is None and self.output is None:
+            return
+        lines = [
+            json.dumps({
+                "transaction_id": result['transaction_id'],
+                "score": float(score),
+                "fraud_flag": int(flag),
+                "primary_score": result['score'],
+                "primary_fraud_flag": result['fraud_flag'],
+                "model_version": self.version,
+            })
+            for result, score, flag in zip(results, shadow_scores, shadow_flags)
+        ]
+        if self.producer is not None:
+            for result, line in zip(results, lines):
+                self.produce(result['transaction_id'], line.encode('utf-8'))
+        if self.output is not None:
+            with self.lock:
+                self.output.write('\n'.join(lines) + '\n')
+
+    def produce(self, key: str, value: bytes):
+        while True:
+            try:
+                self.producer.produce(self.topic, key=key, value=value)
+                return
+            except BufferError:
+                # Очередь продюсера общая с основным путем; ждем, пока цикл обработки ее разгрузит
+                time.sleep(0.05)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {'model_version': self.version, 'pending': self.pending, **self.stats.snapshot()}
+
+    def log_if_due(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_log < SHADOW_STATS_INTERVAL_S:
+            return
+        self.last_log = now
+        stats = self.snapshot()
+        logger.info(
+            f"Shadow stats ({stats['model_version']}): scored={stats['scored']}, dropped={stats['dropped']}, "
+            f"agreement={stats['agreement']:.4f}, primary_only_fraud={stats['primary_only_fraud']}, "
+            f"shadow_only_fraud={stats['shadow_only_fraud']}, delta_mean={stats['delta_mean']:.5f}, "
+            f"delta_std={stats['delta_std']:.5f}, abs_delta_max={stats['abs_delta_max']:.5f}"
+        )
+
+    def close(self):
+        # Дожидаемся поставленных батчей, чтобы их результаты ушли до финального flush сервиса
+        self.executor.shutdown(wait=True)
+        if self.output is not None:
+            self.output.close()
+        self.log_if_due(force=True)
@@ -0,0 +1,203 @@
+# Дневные агрегаты по amount для потокового скоринга
+#
+# В отличие от офлайн-скоринга, в Kafka транзакции приходят по одной или микробатчами,
+# поэтому groupby по всему дню на каждое сообщение невозможен. Агрегатор держит в памяти
+# по каждой дате (и паре дата/пол) компактный скетч распределения сумм, дополняет его
+# транзакциями из очередного батча и вытесняет даты, вышедшие за окно.
+
+import logging
+import math
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Признаки, которые добавляет агрегатор (названия как в mlops1)
+AGGREGATE_FEATURES = [
+    'sum_by_night_part',
+    'mean_by_night_part',
+    'median_by_night_part',
+    'percentile_90',
+    'sum_more_than_90',
+    'count',
+    'mean_amount',
+    'median_amount',
+    'total_sum',
+]
+
+
+class QuantileSketch:
+    """
+    Скетч квантилей с логарифмическими корзинами (по схеме DDSketch).
+    Значение x > 0 попадает в корзину ceil(log_gamma(x)), gamma = (1 + a) / (1 - a),
+    поэтому оценка любого квантиля имеет относительную ошибку не больше a.
+    В каждой корзине хранится число значений и их точная сумма: суммы и средние считаются точно.
+    """
+
+    ZERO_KEY = -(2 ** 31)  # корзина для нулевых (и отрицательных) сумм
+
+    def __init__(self, relative_accuracy=0.01):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.bins = {}  # key -> [count, sum]
+        self.count = 0
+        self.total = 0.0
+
+    def keys(self, values):
+        values = np.asarray(values, dtype=float)
+        keys = np.full(values.shape, self.ZERO_KEY, dtype=np.int64)
+        positive = values > 0
+        keys[positive] = np.ceil(np.log(values[positive]) / math.log(self.gamma)).astype(np.int64)
+        return keys
+
+    def value(self, key):
+        if key == self.ZERO_KEY:
+            return 0.0
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add_bin(self, key, count, total):
+        bin_ = self.bins.setdefault(key, [0, 0.0])
+        bin_[0] += int(count)
+        bin_[1] += float(total)
+        self.count += int(count)
+        self.total += float(total)
+
+    def value_at_rank(self, rank):
+        seen = 0
+        for key in sorted(self.bins):
+            seen += self.bins[key][0]
+            if seen > rank:
+                return self.value(key)
+        return self.value(max(self.bins))
+
+    def quantile(self, q):
+        # Линейная интерполяция между соседними рангами - как в pandas quantile/median
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        lower, upper = math.floor(rank), math.ceil(rank)
+        lower_value = self.value_at_rank(lower)
+        if upper == lower:
+            return lower_value
+        return lower_value + (self.value_at_rank(upper) - lower_value) * (rank - lower)
+
+    def sum_above(self, threshold):
+        # Сумма значений из корзин выше корзины порога; корзина самого порога
+        # учитывается целиком, если среднее значение в ней больше порога
+        threshold_key = self.keys([threshold])[0]
+        return sum(
+            total for key, (count, total) in self.bins.items()
+            if key > threshold_key or (key == threshold_key and total / count > threshold)
+        )
+
+
+class WindowedDailyAggregator:
+    """
+    Дневные агрегаты в скользящем окне дат: все транзакции дня, ночные транзакции дня
+    и транзакции дня по полу. Хранятся только даты не старше window_days от самой свежей,
+    поэтому память ограничена размером окна, а не длиной потока.
+    Ожидает колонки после process_time_features: transaction_date, transaction_time_binning_by_part,
+    amount, gender.
+    """
+
+    def __init__(self, window_days=2, relative_accuracy=0.01):
+        self.window_days = window_days
+        self.relative_accuracy = relative_accuracy
+        self.latest_date = None
+        self.daily = {}   # date -> QuantileSketch
+        self.night = {}   # date -> QuantileSketch
+        self.gender = {}  # date -> {gender: QuantileSketch}
+
+    def _sketch(self, table, key):
+        if key not in table:
+            table[key] = QuantileSketch(self.relative_accuracy)
+        return table[key]
+
+    @staticmethod
+    def _grouped(frame, by):
+        # Число и сумма транзакций по группе и корзине скетча
+        grouped = frame.groupby(by + ['key'], dropna=False)['amount'].agg(['size', 'sum'])
+        return zip(grouped.index, grouped['size'], grouped['sum'])
+
+    @property
+    def cutoff(self):
+        return self.latest_date - timedelta(days=self.window_days)
+
+    def evict(self):
+        expired = [date for date in self.daily if date < self.cutoff]
+        for date in expired:
+            self.daily.pop(date, None)
+            self.night.pop(date, None)
+            self.gender.pop(date, None)
+        if expired:
+            logger.info('Evicted %d dates older than %s', len(expired), self.cutoff)
+
+    def update(self, df):
+        """Добавляет транзакции батча в скетчи и вытесняет даты, вышедшие за окно."""
+        frame = pd.DataFrame({
+            'transaction_date': df['transaction_date'].to_numpy(),
+            'gender': df['gender'].to_numpy(),
+            'amount': df['amount'].to_numpy(dtype=float),
+            'night': (df['transaction_time_binning_by_part'] == "night").to_numpy(),
+        }).dropna(subset=['transaction_date'])
+        if frame.empty:
+            return
+
+        batch_latest = frame['transaction_date'].max()
+        if self.latest_date is None or batch_latest > self.latest_date:
+            self.latest_date = batch_latest
+        # Опоздавшие транзакции за вытесненные даты не возвращают дату в память
+        frame = frame[frame['transaction_date'] >= self.cutoff]
+        frame['key'] = QuantileSketch(self.relative_accuracy).keys(frame['amount'])
+
+        for (date, key), count, total in self._grouped(frame, ['transaction_date']):
+            self._sketch(self.daily, date).add_bin(key, count, total)
+        for (date, key), count, total in self._grouped(frame[frame['night']], ['transaction_date']):
+            self._sketch(self.night, date).add_bin(key, count, total)
+        for (date, gender, key), count, total in self._grouped(frame, ['transaction_date', 'gender']):
+            self._sketch(self.gender.setdefault(date, {}), gender).add_bin(key, count, total)
+
+        self.evict()
+
+    def lookup(self, date, gender=None):
+        """Признаки для одной даты и пола; значения по умолчанию - как после fillna в mlops1."""
+        features = {
+            'sum_by_night_part': 0, 'mean_by_night_part': 0, 'median_by_night_part': 0,
+            'percentile_90': -np.inf, 'sum_more_than_90': 0,
+            'count': np.nan, 'mean_amount': np.nan, 'median_amount': np.nan, 'total_sum': np.nan,
+        }
+        night = self.night.get(date)
+        if night is not None and night.count:
+            features['sum_by_night_part'] = night.total
+            features['mean_by_night_part'] = night.total / night.count
+            features['median_by_night_part'] = night.quantile(0.5)
+
+        daily = self.daily.get(date)
+        if daily is not None and daily.count:
+            features['percentile_90'] = daily.quantile(0.9)
+            features['sum_more_than_90'] = daily.sum_above(features['percentile_90'])
+
+        by_gender = self.gender.get(date, {}).get(gender)
+        if by_gender is not None and by_gender.count:
+            features['count'] = by_gender.count
+            features['mean_amount'] = by_gender.total / by_gender.count
+            features['median_amount'] = by_gender.quantile(0.5)
+            features['total_sum'] = by_gender.total
+        return features
+
+    def transform(self, df):
+        """
+        Добавляет в df колонки AGGREGATE_FEATURES: скетчи читаются один раз
+        на уникальную пару (дата, пол) в батче, а не на каждую транзакцию.
+        """
+        keys = df[['transaction_date', 'gender']].drop_duplicates()
+        features = pd.DataFrame([
+            {'transaction_date': date, 'gender': gender, **self.lookup(date, gender)}
+            for date, gender in keys.itertuples(index=False)
+        ], columns=['transaction_date', 'gender'] + AGGREGATE_FEATURES)
+        merged = df[['transaction_date', 'gender']].merge(features, on=['transaction_date', 'gender'], how='left')
+        for col in AGGREGATE_FEATURES:
+            df[col] = merged[col].to_numpy(dtype=float)
+        return df
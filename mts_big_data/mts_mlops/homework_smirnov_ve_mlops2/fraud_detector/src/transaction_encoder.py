@@ -0,0 +1,98 @@
+# Быстрый путь препроцессинга одной транзакции без pandas
+#
+# run_preproc на одном сообщении строит DataFrame из одной строки, вызывает pd.to_datetime,
+# isocalendar, encoder.transform и переупорядочивает колонки - накладные расходы pandas
+# на порядки больше самих вычислений. Здесь те же признаки считаются из словаря
+# сообщения сразу в numpy-строку в порядке model_features.
+
+import logging
+from datetime import datetime
+
+import holidays
+import numpy as np
+import pandas as pd
+
+from preprocessing import TIME_OF_DAY_BY_HOUR, bearing_degree, haversine_distance
+
+logger = logging.getLogger(__name__)
+
+
+def export_catboost_lookup(encoder):
+    """
+    Таблицы категория -> значение из обученного CatBoostEncoder.
+    Значения считаются той же формулой, что и в CatBoostEncoder.transform без target:
+    среднее по категории со сглаживанием, для редких (одно наблюдение) и новых категорий - общее среднее.
+    """
+    lookup = {}
+    for col, colmap in encoder.mapping.items():
+        level_notunique = colmap['count'] > 1
+        level_means = ((colmap['sum'] + encoder._mean * encoder.a) / (colmap['count'] + encoder.a)).where(
+            level_notunique, encoder._mean
+        )
+        lookup[col] = level_means.to_dict()
+    return lookup, float(encoder._mean)
+
+
+def parse_transaction_time(value):
+    # Обычный формат сообщений - ISO; остальные форматы разбирает pandas, как в run_preproc
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return pd.Timestamp(value).to_pydatetime()
+
+
+class TransactionEncoder:
+    """
+    Признаки одной транзакции (словарь из поля data сообщения) в виде numpy-строки float64
+    в порядке state['model_features']. Результат совпадает с run_preproc(state, pd.DataFrame([data])).
+    """
+
+    def __init__(self, state):
+        self.model_features = list(state['model_features'])
+        self.cat_columns = list(state['cat_columns'])
+        self.lookup, self.prior = export_catboost_lookup(state['encoder'])
+        # Календарь праздников достраивается по годам при первом обращении
+        self.calendar = holidays.US()
+        self.index = {feature: i for i, feature in enumerate(self.model_features)}
+
+    def features(self, data):
+        """Все признаки транзакции словарем: имя признака -> значение."""
+        transaction_time = parse_transaction_time(data['transaction_time'])
+        hour = transaction_time.hour
+        features = {
+            'transaction_time_month': transaction_time.month,
+            'transaction_time_week': transaction_time.isocalendar()[1],
+            'transaction_time_day_of_the_week': transaction_time.weekday(),
+            'transaction_time_hour': hour,
+            'transaction_time_minute': transaction_time.minute,
+            'amount_log': np.log1p(float(data['amount'])),
+        }
+
+        # Три пары точек за один вызов: клиент-мерчант, клиент-(0, 0), (0, 0)-мерчант
+        lat, lon = float(data['lat']), float(data['lon'])
+        merchant_lat, merchant_lon = float(data['merchant_lat']), float(data['merchant_lon'])
+        lat1, lon1 = np.array([lat, lat, 0.0]), np.array([lon, lon, 0.0])
+        lat2, lon2 = np.array([merchant_lat, 0.0, merchant_lat]), np.array([merchant_lon, 0.0, merchant_lon])
+        for i, value in enumerate(bearing_degree(lat1, lon1, lat2, lon2), start=1):
+            features[f'bearing_degree_{i}'] = value
+        for i, value in enumerate(haversine_distance(lat1, lon1, lat2, lon2), start=1):
+            features[f'hav_dist_{i}'] = value
+
+        categories = {col: data.get(col) for col in self.cat_columns}
+        categories['transaction_time_holidays'] = self.calendar.get(transaction_time.date(), 'No Holiday')
+        categories['transaction_time_binning_by_part'] = TIME_OF_DAY_BY_HOUR[hour]
+        for col in self.cat_columns:
+            # str() как astype(str) в process_catboost_encoding
+            features[f'{col}_cb'] = self.lookup[col].get(str(categories[col]), self.prior)
+        return features
+
+    def encode(self, data):
+        row = np.zeros(len(self.model_features), dtype=np.float64)
+        for feature, value in self.features(data).items():
+            i = self.index.get(feature)
+            if i is not None:
+                row[i] = value
+        return row
+
+    def encode_many(self, records):
+        return np.vstack([self.encode(data) for data in records])
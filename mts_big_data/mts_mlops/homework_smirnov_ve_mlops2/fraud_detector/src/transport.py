@@ -0,0 +1,221 @@
+# Транспорт сообщений для ProcessingService
+#
+# KafkaTransport создает Consumer/Producer из confluent_kafka. InMemoryTransport - брокер внутри
+# процесса с тем же подмножеством API, которым пользуется ProcessingService (subscribe/poll/consume/
+# commit/seek/close, assignment/position/get_watermark_offsets, produce/poll/flush); нужен для
+# бенчмарков и проверок без ZooKeeper и Kafka.
+# Одна группа консьюмеров получает все партиции, ребалансировки нет.
+
+import threading
+import time
+import zlib
+
+from confluent_kafka import Consumer, Producer, TopicPartition
+
+
+class KafkaTransport:
+    def consumer(self, config: dict) -> Consumer:
+        return Consumer(config)
+
+    def producer(self, config: dict) -> Producer:
+        return Producer(config)
+
+
+class InMemoryMessage:
+    """Сообщение с методами confluent_kafka.Message; created - perf_counter() в момент produce."""
+
+    __slots__ = ('_topic', '_partition', '_offset', '_key', '_value', '_headers', 'created', 'delivered')
+
+    def __init__(self, topic, partition, offset, key, value, headers):
+        self._topic = topic
+        self._partition = partition
+        self._offset = offset
+        self._key = key
+        self._value = value
+        self._headers = headers
+        self.created = time.perf_counter()
+        self.delivered = None
+
+    def topic(self):
+        return self._topic
+
+    def partition(self):
+        return self._partition
+
+    def offset(self):
+        return self._offset
+
+    def key(self):
+        return self._key
+
+    def value(self):
+        return self._value
+
+    def headers(self):
+        return self._headers
+
+    def error(self):
+        return None
+
+    def latency(self):
+        return self.delivered - self.created if self.delivered is not None else None
+
+
+class InMemoryBroker:
+    """Топики с фиксированным числом партиций и закоммиченные оффсеты групп; потокобезопасен."""
+
+    def __init__(self, num_partitions: int = 3):
+        self.num_partitions = num_partitions
+        self.topics = {}     # topic -> [[сообщения партиции], ...]
+        self.committed = {}  # (group, topic, partition) -> оффсет
+        self.round_robin = 0
+        self.changed = threading.Condition()
+
+    def partitions(self, topic: str) -> list:
+        with self.changed:
+            return self.topics.setdefault(topic, [[] for _ in range(self.num_partitions)])
+
+    def append(self, topic, key, value, headers) -> InMemoryMessage:
+        partitions = self.partitions(topic)
+        with self.changed:
+            if key is not None:
+                partition = zlib.crc32(key) % self.num_partitions
+            else:
+                partition = self.round_robin % self.num_partitions
+                self.round_robin += 1
+            log = partitions[partition]
+            msg = InMemoryMessage(topic, partition, len(log), key, value, headers)
+            log.append(msg)
+            self.changed.notify_all()
+        return msg
+
+    def size(self, topic: str) -> int:
+        return sum(len(log) for log in self.partitions(topic))
+
+
+class InMemoryConsumer:
+    def __init__(self, broker: InMemoryBroker, config: dict):
+        self.broker = broker
+        self.group = config.get('group.id')
+        self.auto_commit = config.get('enable.auto.commit', True)
+        self.positions = {}  # (topic, partition) -> следующий оффсет
+        self.on_assign = None
+        self.assigned = False
+        self.next_partition = 0
+
+    def subscribe(self, topics, on_assign=None, on_revoke=None):
+        for topic in topics:
+            for partition in range(len(self.broker.partitions(topic))):
+                self.positions[(topic, partition)] = self.broker.committed.get((self.group, topic, partition), 0)
+        self.on_assign = on_assign
+
+    def assign_if_needed(self):
+        # Как в Kafka, назначение партиций приходит из первого poll/consume
+        if not self.assigned:
+            self.assigned = True
+            if self.on_assign is not None:
+                self.on_assign(self, [TopicPartition(topic, p) for topic, p in self.positions])
+
+    def available(self) -> int:
+        return sum(
+            len(self.broker.topics[topic][partition]) - offset for (topic, partition), offset in self.positions.items()
+        )
+
+    def take(self, num_messages: int) -> list:
+        # Партиции обходятся по кругу, начиная каждый раз со следующей, чтобы ни одна не простаивала
+        keys = list(self.positions)
+        start = self.next_partition % len(keys)
+        self.next_partition += 1
+        msgs = []
+        for topic, partition in keys[start:] + keys[:start]:
+            offset = self.positions[(topic, partition)]
+            taken = self.broker.topics[topic][partition][offset:offset + num_messages - len(msgs)]
+            self.positions[(topic, partition)] = offset + len(taken)
+            msgs.extend(taken)
+            if len(msgs) >= num_messages:
+                break
+        return msgs
+
+    def consume(self, num_messages=1, timeout=-1):
+        # Ждет num_messages сообщений, но не дольше timeout (как Consumer.consume)
+        self.assign_if_needed()
+        deadline = time.monotonic() + timeout if timeout >= 0 else None
+        with self.broker.changed:
+            while self.available() < num_messages:
+                remaining = deadline - time.monotonic() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    break
+                self.broker.changed.wait(remaining)
+            return self.take(num_messages)
+
+    def poll(self, timeout=None):
+        msgs = self.consume(1, timeout if timeout is not None else -1)
+        return msgs[0] if msgs else None
+
+    def assignment(self) -> list:
+        return [TopicPartition(topic, partition) for topic, partition in self.positions]
+
+    def position(self, partitions) -> list:
+        return [TopicPartition(tp.topic, tp.partition, self.positions[(tp.topic, tp.partition)]) for tp in partitions]
+
+    def get_watermark_offsets(self, partition, timeout=None, cached=False):
+        return 0, len(self.broker.topics[partition.topic][partition.partition])
+
+    def commit(self, offsets=None, asynchronous=True):
+        if offsets is None:
+            offsets = [TopicPartition(topic, p, offset) for (topic, p), offset in self.positions.items()]
+        with self.broker.changed:
+            for tp in offsets:
+                self.broker.committed[(self.group, tp.topic, tp.partition)] = tp.offset
+
+    def seek(self, partition):
+        with self.broker.changed:
+            self.positions[(partition.topic, partition.partition)] = partition.offset
+
+    def close(self):
+        if self.auto_commit:
+            self.commit()
+
+
+class InMemoryProducer:
+    """Сообщение сразу попадает в брокер, колбэк доставки вызывается из poll()/flush()."""
+
+    def __init__(self, broker: InMemoryBroker, config: dict):
+        self.broker = broker
+        self.pending = []
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def produce(self, topic, value=None, key=None, headers=None, on_delivery=None):
+        if isinstance(key, str):
+            key = key.encode('utf-8')
+        msg = self.broker.append(topic, key, value, headers)
+        if on_delivery is not None:
+            with self.lock:
+                self.pending.append((msg, on_delivery))
+
+    def poll(self, timeout=0):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        now = time.perf_counter()
+        for msg, on_delivery in pending:
+            msg.delivered = now
+            on_delivery(None, msg)
+        return len(pending)
+
+    def flush(self, timeout=None):
+        self.poll()
+        return 0
+
+
+class InMemoryTransport:
+    def __init__(self, broker: InMemoryBroker = None):
+        self.broker = broker if broker is not None else InMemoryBroker()
+
+    def consumer(self, config: dict) -> InMemoryConsumer:
+        return InMemoryConsumer(self.broker, config)
+
+    def producer(self, config: dict) -> InMemoryProducer:
+        return InMemoryProducer(self.broker, config)
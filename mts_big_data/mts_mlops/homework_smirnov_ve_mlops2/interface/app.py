@@ -1,136 +1,126 @@
-import streamlit as st
-import pandas as pd
-from kafka import KafkaProducer
-from kafka import KafkaConsumer
-import json
-import time
-import os
-import uuid
-
-# Конфигурация Kafka
-KAFKA_CONFIG = {
-    "bootstrap_servers": os.getenv("KAFKA_BROKERS", "kafka:9092"),
-    "topic": os.getenv("KAFKA_TOPIC", "transactions")
-}
-
-def load_file(uploaded_file):
-    """Загрузка CSV файла в DataFrame"""
-    try:
-        return pd.read_csv(uploaded_file)
-    except Exception as e:
-        st.error(f"Ошибка загрузки файла: {str(e)}")
-        return None
-
-def send_to_kafka(df, topic, bootstrap_servers):
-    """Отправка данных в Kafka с уникальным ID транзакции"""
-    try:
-        producer = KafkaProducer(
-            bootstrap_servers=bootstrap_servers,
-            value_serializer=lambda v: json.dumps(v).encode("utf-8"),
-            security_protocol="PLAINTEXT"
-        )
-        
-        # Генерация уникальных ID для всех транзакций
-        df['transaction_id'] = [str(uuid.uuid4()) for _ in range(len(df))]
-        
-        progress_bar = st.progress(0)
-        total_rows = len(df)
-        
-        for idx, row in df.iterrows():
-            # Отправляем данные вместе с ID
-            producer.send(
-                topic, 
-                value={
-                    "transaction_id": row['transaction_id'],
-                    "data": row.drop('transaction_id').to_dict()
-                }
-            )
-            progress_bar.progress((idx + 1) / total_rows)
-            time.sleep(0.01)
-            
-        producer.flush()
-     
-        return True
-    except Exception as e:
-        st.error(f"Ошибка отправки данных: {str(e)}")
-        return False
-
-# Инициализация состояния
-if "uploaded_files" not in st.session_state:
-    st.session_state.uploaded_files = {}
-
-# Интерфейс
-st.title("Отправка данных в Kafka")
-
-# Блок загрузки файлов
-uploaded_file = st.file_uploader(
-    "Загрузите CSV файл с транзакциями",
-    type=["csv"]
-)
-
-if uploaded_file and uploaded_file.name not in st.session_state.uploaded_files:
-    # Добавляем файл в состояние
-    st.session_state.uploaded_files[uploaded_file.name] = {
-        "status": "Загружен",
-        "df": load_file(uploaded_file)
-    }
-    st.success(f"Файл {uploaded_file.name} успешно загружен!")
-
-# Список загруженных файлов
-if st.session_state.uploaded_files:
-    st.subheader("Список загруженных файлов")
-    
-    for file_name, file_data in st.session_state.uploaded_files.items():
-        cols = st.columns([4, 2, 2])
-        
-        with cols[0]:
-            st.markdown(f"**Файл:** `{file_name}`")
-            st.markdown(f"**Статус:** `{file_data['status']}`")
-        
-        with cols[2]:
-            if st.button(f"Отправить {file_name}", key=f"send_{file_name}"):
-                if file_data["df"] is not None:
-                    with st.spinner("Отправка..."):
-                        success = send_to_kafka(
-                            file_data["df"],
-                            KAFKA_CONFIG["topic"],
-                            KAFKA_CONFIG["bootstrap_servers"]
-                        )
-                        if success:
-                            st.session_state.uploaded_files[file_name]["status"] = "Отправлен"
-                            st.rerun()
-                else:
-                    st.error("Файл не содержит данных")
-
-def read_scoring_messages(bootstrap_servers, topic, max_msgs=200, timeout_ms=500):
-    consumer = KafkaConsumer(
-        topic,
-        bootstrap_servers=bootstrap_servers,
-        auto_offset_reset='earliest',
-        consumer_timeout_ms=timeout_ms,
-        value_deserializer=lambda m: json.loads(m.decode('utf-8'))
-    )
-    rows = []
-    try:
-        for i, msg in enumerate(consumer):
-            rows.append(msg.value)
-            if i+1 >= max_msgs:
-                break
-    finally:
-        consumer.close()
-    return pd.DataFrame(rows)
-
-# В Streamlit-интерфейсе:
-if st.button("Посмотреть результаты"):
-    df_scores = read_scoring_messages(
-        bootstrap_servers=KAFKA_CONFIG["bootstrap_servers"],
-        topic=os.getenv("KAFKA_SCORING_TOPIC", "scoring"),
-        max_msgs=200,
-        timeout_ms=2000
-    )
-    if not df_scores.empty:
-        st.dataframe(df_scores[['transaction_id','score','fraud_flag']].tail(100))
-        st.write("Гистограмма последних 100 скорoв")
-        st.bar_chart(df_scores['score'].tail(100))
-    else:
-        st.info("Пока нет сообщений в топике scoring")
\ No newline at end of file
+import streamlit as st
+import pandas as pd
+import os
+
+from loader import BulkLoader, make_producer
+from score_feed import ScoreFeed
+
+# Конфигурация Kafka
+KAFKA_CONFIG = {
+    "bootstrap_servers": os.getenv("KAFKA_BROKERS", "kafka:9092"),
+    "topic": os.getenv("KAFKA_TOPIC", "transactions")
+}
+
+# Лента результатов: сколько последних скоров хранить, окно доли фрода и период обновления
+RESULTS_BUFFER_SIZE = int(os.getenv("RESULTS_BUFFER_SIZE", "10000"))
+RESULTS_WINDOW_MINUTES = int(os.getenv("RESULTS_WINDOW_MINUTES", "60"))
+RESULTS_REFRESH_S = float(os.getenv("RESULTS_REFRESH_S", "2"))
+
+def load_file(uploaded_file):
+    """Загрузка CSV файла в DataFrame"""
+    try:
+        return pd.read_csv(uploaded_file)
+    except Exception as e:
+        st.error(f"Ошибка загрузки файла: {str(e)}")
+        return None
+
+def send_to_kafka(df, topic, bootstrap_servers):
+    """Отправка данных в Kafka пачками, каждой транзакции присваивается уникальный ID"""
+    try:
+        producer = make_producer(bootstrap_servers)
+        progress_bar = st.progress(0.0)
+        total_rows = len(df)
+
+        # Прогресс обновляется не чаще LOADER_PROGRESS_INTERVAL_S, а не на каждой строке
+        loader = BulkLoader(
+            producer,
+            topic,
+            progress=lambda sent, total: progress_bar.progress(sent / max(total, 1), text=f"{sent} / {total}")
+        )
+        loader.send_dataframe(df)
+        loader.flush(total_rows)
+        producer.close()
+
+        if loader.failed:
+            st.error(f"Не доставлено сообщений: {loader.failed}")
+            return False
+        return True
+    except Exception as e:
+        st.error(f"Ошибка отправки данных: {str(e)}")
+        return False
+
+# Инициализация состояния
+if "uploaded_files" not in st.session_state:
+    st.session_state.uploaded_files = {}
+
+# Интерфейс
+st.title("Отправка данных в Kafka")
+
+# Блок загрузки файлов
+uploaded_file = st.file_uploader(
+    "Загрузите CSV файл с транзакциями",
+    type=["csv"]
+)
+
+if uploaded_file and uploaded_file.name not in st.session_state.uploaded_files:
+    # Добавляем файл в состояние
+    st.session_state.uploaded_files[uploaded_file.name] = {
+        "status": "Загружен",
+        "df": load_file(uploaded_file)
+    }
+    st.success(f"Файл {uploaded_file.name} успешно загружен!")
+
+# Список загруженных файлов
+if st.session_state.uploaded_files:
+    st.subheader("Список загруженных файлов")
+    
+    for file_name, file_data in st.session_state.uploaded_files.items():
+        cols = st.columns([4, 2, 2])
+        
+        with cols[0]:
+            st.markdown(f"**Файл:** `{file_name}`")
+            st.markdown(f"**Статус:** `{file_data['status']}`")
+        
+        with cols[2]:
+            if st.button(f"Отправить {file_name}", key=f"send_{file_name}"):
+                if file_data["df"] is not None:
+                    with st.spinner("Отправка..."):
+                        success = send_to_kafka(
+                            file_data["df"],
+                            KAFKA_CONFIG["topic"],
+                            KAFKA_CONFIG["bootstrap_servers"]
+                        )
+                        if success:
+                            st.session_state.uploaded_files[file_name]["status"] = "Отправлен"
+                            st.rerun()
+                else:
+                    st.error("Файл не содержит данных")
+
+@st.cache_resource
+def get_score_feed(bootstrap_servers, topic):
+    """Один consumer на процесс интерфейса: живет между перезапусками скрипта и сессиями"""
+    return ScoreFeed(
+        bootstrap_servers,
+        topic,
+        capacity=RESULTS_BUFFER_SIZE,
+        window_minutes=RESULTS_WINDOW_MINUTES
+    ).start()
+
+@st.fragment(run_every=RESULTS_REFRESH_S)
+def show_results():
+    feed = get_score_feed(KAFKA_CONFIG["bootstrap_servers"], os.getenv("KAFKA_SCORING_TOPIC", "scoring"))
+    snapshot = feed.snapshot(last_n=100)
+    if snapshot["buffered"] == 0:
+        st.info("Пока нет сообщений в топике scoring")
+        return
+
+    st.caption(f"Прочитано результатов: {snapshot['consumed']}, в окне: {snapshot['buffered']}")
+    st.dataframe(snapshot["latest"])
+    st.write(f"Гистограмма скоров последних {snapshot['buffered']} транзакций")
+    st.bar_chart(snapshot["histogram"])
+    st.write("Доля фрода по минутам")
+    st.line_chart(snapshot["fraud_rate"]["fraud_rate"])
+
+# В Streamlit-интерфейсе:
+if st.toggle("Показывать результаты"):
+    show_results()
\ No newline at end of file
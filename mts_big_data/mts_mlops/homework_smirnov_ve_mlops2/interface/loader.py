@@ -0,0 +1,147 @@
+"""
+Пакетная загрузка транзакций из CSV в топик transactions.
+
+Используется интерфейсом (send_to_kafka в app.py) и запускается отдельно:
+    python loader.py --input ./transactions.csv --rate 5000
+
+DataFrame переводится в записи целиком (to_dict(orient='records')), а не построчно через iterrows;
+сообщения кодируются и отправляются пачками по batch_size, продюсер сам собирает их в запросы
+к брокеру (linger_ms, batch_size). Скорость можно ограничить токен-бакетом, прогресс
+сообщается не чаще раза в progress_interval_s.
+"""
+
+import argparse
+import logging
+import os
+import time
+import uuid
+
+import pandas as pd
+from kafka import KafkaProducer
+
+from codec import TRANSACTIONS_FORMAT, check_format, encode_transaction, format_headers
+
+logger = logging.getLogger(__name__)
+
+LOADER_BATCH_SIZE = int(os.getenv("LOADER_BATCH_SIZE", "1000"))
+# Ограничение скорости отправки, сообщений/сек (0 - без ограничения)
+LOADER_RATE_LIMIT = float(os.getenv("LOADER_RATE_LIMIT", "0"))
+LOADER_PROGRESS_INTERVAL_S = float(os.getenv("LOADER_PROGRESS_INTERVAL_S", "0.25"))
+LOADER_LINGER_MS = int(os.getenv("LOADER_LINGER_MS", "20"))
+LOADER_PRODUCER_BATCH_BYTES = int(os.getenv("LOADER_PRODUCER_BATCH_BYTES", str(256 * 1024)))
+
+
+class TokenBucket:
+    """Токен-бакет: в среднем rate сообщений/сек, всплески до burst сообщений."""
+
+    def __init__(self, rate: float, burst: float = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.last = time.monotonic()
+
+    def acquire(self, n: int = 1):
+        # Пачка больше burst берется в долг: следующая будет ждать, пока долг не погасится
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last = now
+        self.tokens -= n
+        if self.tokens < 0:
+            time.sleep(-self.tokens / self.rate)
+
+
+def make_producer(bootstrap_servers: str) -> KafkaProducer:
+    return KafkaProducer(
+        bootstrap_servers=bootstrap_servers,
+        linger_ms=LOADER_LINGER_MS,
+        batch_size=LOADER_PRODUCER_BATCH_BYTES,
+        security_protocol="PLAINTEXT"
+    )
+
+
+class BulkLoader:
+    """
+    Отправка DataFrame в Kafka. progress - функция (отправлено, всего), вызывается
+    не чаще раза в progress_interval_s и один раз в конце.
+    """
+
+    def __init__(self, producer, topic: str, fmt: str = TRANSACTIONS_FORMAT, batch_size: int = LOADER_BATCH_SIZE,
+                 rate_limit: float = LOADER_RATE_LIMIT, progress=None,
+                 progress_interval_s: float = LOADER_PROGRESS_INTERVAL_S):
+        self.producer = producer
+        self.topic = topic
+        self.fmt = check_format(fmt)
+        self.headers = format_headers(fmt)
+        self.batch_size = batch_size
+        self.bucket = TokenBucket(rate_limit, burst=max(rate_limit, batch_size)) if rate_limit > 0 else None
+        self.progress = progress
+        self.progress_interval_s = progress_interval_s
+        self.sent = 0
+        self.failed = 0
+        self.last_progress = 0.0
+
+    def on_error(self, exc):
+        self.failed += 1
+        logger.error(f"Delivery to {self.topic} failed: {exc}")
+
+    def report(self, total: int, force: bool = False):
+        now = time.monotonic()
+        if self.progress is None or (not force and now - self.last_progress < self.progress_interval_s):
+            return
+        self.last_progress = now
+        self.progress(self.sent, total)
+
+    def send_dataframe(self, df: pd.DataFrame, total: int = None) -> int:
+        """Отправляет строки df, каждой присваивается новый transaction_id. Возвращает число отправленных."""
+        total = total if total is not None else len(df)
+        records = df.drop(columns=['transaction_id'], errors='ignore').to_dict(orient='records')
+
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            if self.bucket is not None:
+                self.bucket.acquire(len(batch))
+            for record in batch:
+                value = encode_transaction({"transaction_id": str(uuid.uuid4()), "data": record}, self.fmt)
+                self.producer.send(self.topic, value=value, headers=self.headers).add_errback(self.on_error)
+            self.sent += len(batch)
+            self.report(total)
+
+        return len(records)
+
+    def send_csv(self, path: str, chunksize: int = 100000) -> int:
+        # Файл читается частями, поэтому память не зависит от его размера
+        for chunk in pd.read_csv(path, chunksize=chunksize):
+            self.send_dataframe(chunk.drop(columns=['target'], errors='ignore'), total=None)
+        return self.sent
+
+    def flush(self, total: int = None):
+        self.producer.flush()
+        self.report(total if total is not None else self.sent, force=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', required=True, help='CSV с транзакциями')
+    parser.add_argument('--topic', default=os.getenv("KAFKA_TOPIC", "transactions"), help='Топик Kafka')
+    parser.add_argument('--bootstrap-servers', default=os.getenv("KAFKA_BROKERS", "kafka:9092"), help='Брокеры Kafka')
+    parser.add_argument('--format', default=TRANSACTIONS_FORMAT, help='Формат сообщений: json или msgpack')
+    parser.add_argument('--batch-size', type=int, default=LOADER_BATCH_SIZE, help='Сообщений в пачке')
+    parser.add_argument('--rate', type=float, default=LOADER_RATE_LIMIT, help='Сообщений/сек, 0 - без ограничения')
+    parser.add_argument('--chunksize', type=int, default=100000, help='Строк CSV в памяти')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    start = time.perf_counter()
+    loader = BulkLoader(
+        make_producer(args.bootstrap_servers), args.topic, fmt=args.format, batch_size=args.batch_size,
+        rate_limit=args.rate, progress=lambda sent, total: logger.info(f"Sent {sent} messages"),
+        progress_interval_s=5.0
+    )
+    loader.send_csv(args.input, chunksize=args.chunksize)
+    loader.flush()
+    elapsed = time.perf_counter() - start
+    logger.info(f"Done: {loader.sent} messages in {elapsed:.1f} s ({loader.sent / elapsed:.0f} msg/s), failed={loader.failed}")
+
+
+if __name__ == '__main__':
+    main()
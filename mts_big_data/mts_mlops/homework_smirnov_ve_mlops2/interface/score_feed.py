@@ -0,0 +1,131 @@
+"""
+Лента результатов скоринга для интерфейса.
+
+Один долгоживущий KafkaConsumer в фоновом потоке читает топик scoring с конца и складывает
+результаты в кольцевой буфер фиксированного размера. Гистограмма скоров по буферу и доля
+фрода по минутам обновляются на каждом сообщении за O(1), поэтому отрисовка зависит только
+от размера окна, а не от размера топика.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+from kafka import KafkaConsumer, TopicPartition
+
+from codec import SCORING_FORMAT, decode_score, message_format
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreFeed:
+    """
+    capacity - сколько последних результатов хранить; при старте с каждой партиции
+    читается не больше capacity последних сообщений. window_minutes - за сколько минут
+    (по времени сообщений) хранить долю фрода.
+    """
+
+    def __init__(self, bootstrap_servers: str, topic: str, capacity: int = 10000, window_minutes: int = 60,
+                 hist_bins: int = 20):
+        self.bootstrap_servers = bootstrap_servers
+        self.topic = topic
+        self.window_minutes = window_minutes
+
+        self.buffer = deque(maxlen=capacity)
+        self.hist_edges = np.linspace(0.0, 1.0, hist_bins + 1)
+        self.hist_counts = np.zeros(hist_bins, dtype=np.int64)
+        self.minutes = OrderedDict()  # минута -> [транзакций, фрода]
+        self.consumed = 0
+        self.errors = 0
+
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="score-feed", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def hist_bin(self, score: float) -> int:
+        return min(int(score * len(self.hist_counts)), len(self.hist_counts) - 1)
+
+    def add(self, result: dict, timestamp_ms: int):
+        minute = timestamp_ms // 60000
+        with self.lock:
+            # Вытесняемый из буфера результат уходит и из гистограммы
+            if len(self.buffer) == self.buffer.maxlen:
+                self.hist_counts[self.buffer[0][3]] -= 1
+            bin_idx = self.hist_bin(result['score'])
+            self.buffer.append((result['transaction_id'], result['score'], result['fraud_flag'], bin_idx))
+            self.hist_counts[bin_idx] += 1
+
+            counts = self.minutes.get(minute)
+            if counts is None:
+                counts = self.minutes[minute] = [0, 0]
+                # Сообщения приходят почти по порядку времени, старые минуты лежат в начале
+                while next(iter(self.minutes)) <= minute - self.window_minutes:
+                    self.minutes.popitem(last=False)
+            counts[0] += 1
+            counts[1] += result['fraud_flag']
+            self.consumed += 1
+
+    def make_consumer(self) -> KafkaConsumer:
+        # Без group_id: оффсеты не коммитятся, каждый процесс интерфейса читает топик сам
+        consumer = KafkaConsumer(bootstrap_servers=self.bootstrap_servers, enable_auto_commit=False)
+        partitions = [TopicPartition(self.topic, p) for p in sorted(consumer.partitions_for_topic(self.topic) or [])]
+        if not partitions:
+            consumer.close()
+            raise RuntimeError(f"Topic {self.topic} not found")
+        consumer.assign(partitions)
+
+        # Старт с конца: не больше capacity последних сообщений с каждой партиции
+        beginning = consumer.beginning_offsets(partitions)
+        end = consumer.end_offsets(partitions)
+        for tp in partitions:
+            consumer.seek(tp, max(beginning[tp], end[tp] - self.buffer.maxlen))
+        return consumer
+
+    def run(self):
+        consumer = None
+        while True:
+            try:
+                if consumer is None:
+                    consumer = self.make_consumer()
+                for records in consumer.poll(timeout_ms=1000).values():
+                    for msg in records:
+                        self.add(decode_score(msg.value, message_format(msg.headers, SCORING_FORMAT)), msg.timestamp)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Score feed error: {e}")
+                if consumer is not None:
+                    consumer.close()
+                    consumer = None
+                time.sleep(5)
+
+    def snapshot(self, last_n: int = 100) -> dict:
+        """Копия состояния для отрисовки: последние last_n результатов, гистограмма, доля фрода по минутам."""
+        with self.lock:
+            # Индексация deque у краев - O(1), весь буфер не копируется
+            last = [self.buffer[-i] for i in range(min(last_n, len(self.buffer)), 0, -1)]
+            hist = self.hist_counts.copy()
+            minutes = [(minute, count, fraud) for minute, (count, fraud) in self.minutes.items()]
+            consumed, buffered = self.consumed, len(self.buffer)
+
+        latest = pd.DataFrame(
+            [row[:3] for row in last], columns=['transaction_id', 'score', 'fraud_flag']
+        )
+        histogram = pd.Series(
+            hist, index=[f"{left:.2f}" for left in self.hist_edges[:-1]], name='transactions'
+        )
+        fraud_rate = pd.DataFrame(minutes, columns=['minute', 'transactions', 'fraud'])
+        fraud_rate['minute'] = pd.to_datetime(fraud_rate['minute'] * 60, unit='s')
+        fraud_rate['fraud_rate'] = fraud_rate['fraud'] / fraud_rate['transactions']
+        return {
+            'latest': latest,
+            'histogram': histogram,
+            'fraud_rate': fraud_rate.set_index('minute'),
+            'consumed': consumed,
+            'buffered': buffered,
+        }